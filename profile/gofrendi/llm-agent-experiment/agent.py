@@ -1,3 +1,4 @@
+import asyncio
 import inspect
 import subprocess
 import json
@@ -5,10 +6,12 @@ import re
 import litellm
 import requests
 from typing import (
-    get_type_hints, get_origin, get_args, Annotated, Literal, List, Mapping, Any,
-    Callable, Optional
+    get_type_hints, get_origin, get_args, Annotated, Literal, Dict, List, Mapping,
+    Any, Callable, Optional, Tuple
 )
 
+from calculator import evaluate, evaluate_batch, evaluate_vectorized
+
 
 def extract_metadata(func):
     """
@@ -119,6 +122,7 @@ class Agent():
         previous_messages: Optional[List[Any]] = None,
         tools: List[Callable] = [],
         max_iteration: int = 10,
+        iteration_timeout: Optional[float] = None,
         **kwargs: Mapping[str, Any],
     ):
         def finish_conversation(final_answer: str) -> str:
@@ -130,6 +134,7 @@ class Agent():
         self._model = model
         self._tools = [finish_conversation] + tools
         self._max_iteration = max_iteration
+        self._iteration_timeout = iteration_timeout
         self._kwargs = kwargs
         self._return = ""
         if system_message_template is None:
@@ -171,31 +176,16 @@ class Agent():
     def get_history(self) -> List[Any]:
         return self._previous_messages
 
-    def add_user_message(self, user_message: Any) -> List[Any]:
-        self._append_message({"role": "user", "content": user_message})
-        print("📜 System prompt")
-        print(self.get_system_messages()["content"])
-        print("📜 Previous messages")
-        for previous_message in self.get_history():
-            print(previous_message)
+    def add_user_message(self, user_message: Any) -> Any:
+        self._start_conversation(user_message)
         for i in range(self._max_iteration):
             response = litellm.completion(
                 model=self._model, messages=self._messages, **self._kwargs
             )
-            response_message = response.choices[0].message
-            self._messages.append(response_message)
-            print("🤖 Response", response_message)
-            try:
-                response_map = self._extract_agent_message(response_message.content)
-                self._validate_agent_message(response_map)
-            except Exception as exc:
-                print("🛑 Error", f"{exc}")
-                self._append_feedback_error(exc)
+            response_map = self._handle_response_message(response.choices[0].message)
+            if response_map is None:
                 continue
-            print("🥝 Response map", response_map)
-            action = response_map.get("action", {})
-            function_name = action.get("function", "")
-            function_kwargs = action.get("arguments", {})
+            function_name, function_kwargs = self._get_action(response_map)
             result = None
             try:
                 self._validate_function_call(function_name, function_kwargs)
@@ -210,6 +200,76 @@ class Agent():
         self._finished = False
         return None
 
+    async def add_user_message_async(self, user_message: Any) -> Any:
+        """
+        Asyncio version of `add_user_message`.
+        Uses `litellm.acompletion`, awaits coroutine tools and runs sync tools
+        in a thread. Each iteration is bounded by `iteration_timeout` (if set).
+        """
+        self._start_conversation(user_message)
+        for i in range(self._max_iteration):
+            try:
+                result = await asyncio.wait_for(
+                    self._run_iteration_async(), timeout=self._iteration_timeout
+                )
+            except asyncio.TimeoutError:
+                exc = self._map_to_exception({
+                    "code": "TIMEOUT",
+                    "error_message": f"The step took more than {self._iteration_timeout} seconds",  # noqa
+                })
+                print("🛑 Error", f"{exc}")
+                self._append_feedback_error(exc)
+                continue
+            if self._finished:
+                return result
+        self._finished = False
+        return None
+
+    async def _run_iteration_async(self) -> Any:
+        response = await litellm.acompletion(
+            model=self._model, messages=self._messages, **self._kwargs
+        )
+        response_map = self._handle_response_message(response.choices[0].message)
+        if response_map is None:
+            return None
+        function_name, function_kwargs = self._get_action(response_map)
+        result = None
+        try:
+            self._validate_function_call(function_name, function_kwargs)
+            result = await self._execute_function_async(function_name, function_kwargs)  # noqa
+            print("✅ Result", result)
+            self._append_function_call_ok(function_name, function_kwargs, result)
+        except Exception as exc:
+            print("🛑 Error", f"{exc}")
+            self._append_function_call_error(function_name, function_kwargs, exc)
+        return result
+
+    def _start_conversation(self, user_message: Any):
+        self._finished = False
+        self._append_message({"role": "user", "content": user_message})
+        print("📜 System prompt")
+        print(self.get_system_messages()["content"])
+        print("📜 Previous messages")
+        for previous_message in self.get_history():
+            print(previous_message)
+
+    def _handle_response_message(self, response_message: Any) -> Optional[Mapping[str, Any]]:  # noqa
+        self._messages.append(response_message)
+        print("🤖 Response", response_message)
+        try:
+            response_map = self._extract_agent_message(response_message.content)
+            self._validate_agent_message(response_map)
+        except Exception as exc:
+            print("🛑 Error", f"{exc}")
+            self._append_feedback_error(exc)
+            return None
+        print("🥝 Response map", response_map)
+        return response_map
+
+    def _get_action(self, response_map: Mapping[str, Any]) -> Tuple[str, Mapping[str, Any]]:  # noqa
+        action = response_map.get("action", {})
+        return action.get("function", ""), action.get("arguments", {})
+
     def _append_feedback_error(self, exc: Exception):
         self._append_message({
             "role": "user",
@@ -297,15 +357,35 @@ class Agent():
     ) -> Any:
         try:
             function_map = self._function_map
-            return function_map[function_name](**kwargs)
+            result = function_map[function_name](**kwargs)
+            if inspect.isawaitable(result):
+                result = asyncio.run(result)
+            return result
         except Exception as exc:
-            raise self._map_to_exception({
-                "code": "EXECUTION FAILED",
-                "error_message": f"Failed to execute function: {exc}",
-                "reminder": {
-                    "valid_function_schema": self._function_schemas[function_name],
-                }
-            })
+            raise self._map_execution_exception(function_name, exc)
+
+    async def _execute_function_async(
+        self, function_name: str, kwargs: Mapping[str, Any]
+    ) -> Any:
+        try:
+            function = self._function_map[function_name]
+            if inspect.iscoroutinefunction(function):
+                return await function(**kwargs)
+            result = await asyncio.to_thread(function, **kwargs)
+            if inspect.isawaitable(result):
+                result = await result
+            return result
+        except Exception as exc:
+            raise self._map_execution_exception(function_name, exc)
+
+    def _map_execution_exception(self, function_name: str, exc: Exception) -> Exception:  # noqa
+        return self._map_to_exception({
+            "code": "EXECUTION FAILED",
+            "error_message": f"Failed to execute function: {exc}",
+            "reminder": {
+                "valid_function_schema": self._function_schemas[function_name],
+            }
+        })
 
     def _extract_agent_message(self, response_content) -> Mapping[str, Any]:
         try:
@@ -378,10 +458,21 @@ class Agent():
             })
 
 
+# Shared session, so tools reuse keep-alive connections instead of a new handshake
+http_session = requests.Session()
+http_session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=10))
+http_session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=10))
+HTTP_TIMEOUT = 30
+# A runaway command should not hang the conversation
+SHELL_TIMEOUT = 60
+
+
 def get_current_location() -> Annotated[str, "JSON string representing latitude and longitude"]:  # noqa
     """Get the user's current location."""
     return json.dumps(
-        requests.get("http://ip-api.com/json?fields=lat,lon").json()
+        http_session.get(
+            "http://ip-api.com/json?fields=lat,lon", timeout=HTTP_TIMEOUT
+        ).json()
     )
 
 
@@ -391,7 +482,7 @@ def get_current_weather(
     temperature_unit: Literal["celsius", "fahrenheit"],
 ) -> str:
     """Get the current weather in a given location."""
-    resp = requests.get(
+    resp = http_session.get(
         "https://api.open-meteo.com/v1/forecast",
         params={
             "latitude": latitude,
@@ -399,6 +490,7 @@ def get_current_weather(
             "temperature_unit": temperature_unit,
             "current_weather": True,
         },
+        timeout=HTTP_TIMEOUT,
     )
     return json.dumps(resp.json())
 
@@ -407,13 +499,26 @@ def calculate(
     formula: Annotated[str, "A simple mathematical expression containing only numbers and basic operators (+, -, *, /)."],  # noqa
 ) -> str:
     """Perform a calculation."""
-    return str(eval(formula))
+    return str(evaluate(formula))
+
+
+def calculate_batch(
+    formulas: Annotated[List[str], "Mathematical expressions to calculate, e.g., [\"(143 - 127) / 127\", \"2 ** 10\"]"] = [],  # noqa
+    formula: Annotated[str, "One mathematical expression using the variables, e.g., \"(revenue - cost) / revenue\""] = "",  # noqa
+    variables: Annotated[Dict[str, List[float]], "Variable name to its values, e.g., {\"revenue\": [143, 127], \"cost\": [120, 110]}"] = {},  # noqa
+) -> str:
+    """Perform many calculations at once: every formula, or one formula for every row of variables."""  # noqa
+    results = evaluate_batch(formulas)
+    if formula != "":
+        results += evaluate_vectorized(formula, variables)
+    return json.dumps(results)
 
 
 def run_shell_command(command: str) -> str:
     """Running a shell command"""
     output = subprocess.check_output(
-        command, shell=True, stderr=subprocess.STDOUT, text=True
+        command, shell=True, stderr=subprocess.STDOUT, text=True,
+        timeout=SHELL_TIMEOUT,
     )
     return output
 
@@ -444,6 +549,7 @@ for model in models:
             get_current_location,
             get_current_weather,
             calculate,
+            calculate_batch,
             run_shell_command,
         ],
         max_iteration=10
@@ -0,0 +1,181 @@
+"""
+Check `calculator` against `eval` and benchmark it.
+
+- Random formulas (numbers, operators, parentheses, functions) must give the
+  same result (or the same error) as `eval`.
+- Unsafe formulas must be rejected.
+- Every function, with 1, 2 and 3 arguments, and `**` (large and negative
+  exponents) must give the same result (or an error in both cases) per row
+  and vectorized.
+- Timings: `eval` vs `evaluate` (cached), and one formula over N rows with
+  `evaluate` per row vs `evaluate_vectorized`.
+
+Run from the `llm-agent-experiment` directory:
+
+    python -m benchmark.calculator
+"""
+import math
+import random
+import timeit
+
+from calculator import (
+    VECTORIZE_MIN_ROWS, _FUNCTIONS, compile_formula, evaluate, evaluate_vectorized
+)
+
+UNSAFE_FORMULAS = [
+    "__import__('os').system('echo pwned')",
+    "().__class__.__bases__[0].__subclasses__()",
+    "open('/etc/passwd').read()",
+    "[x for x in range(10**9)]",
+    "(lambda: 1)()",
+    "9 ** 9 ** 9",
+    "abs.__self__",
+    "'a' * 10",
+]
+OPERATORS = ["+", "-", "*", "/", "//", "%", "**"]
+FUNCTIONS = ["abs", "round", "min", "max", "sqrt", "floor", "ceil"]
+NAMESPACE = {
+    "__builtins__": {}, "abs": abs, "round": round, "min": min, "max": max,
+    "sqrt": math.sqrt, "floor": math.floor, "ceil": math.ceil, "pi": math.pi,
+}
+
+
+def random_formula(rng: random.Random, depth: int = 0) -> str:
+    choice = rng.random()
+    if depth > 3 or choice < 0.3:
+        return rng.choice([
+            str(rng.randint(0, 1000)), f"{rng.uniform(-100, 100):.2f}", "pi"
+        ])
+    if choice < 0.4:
+        return f"-{random_formula(rng, depth + 1)}"
+    if choice < 0.5:
+        function = rng.choice(FUNCTIONS)
+        if function in ("min", "max"):
+            return f"{function}({random_formula(rng, depth + 1)}, {random_formula(rng, depth + 1)})"  # noqa
+        return f"{function}({random_formula(rng, depth + 1)})"
+    operator = rng.choice(OPERATORS)
+    if operator == "**":
+        return f"({random_formula(rng, depth + 1)}) ** {rng.randint(0, 3)}"
+    return f"({random_formula(rng, depth + 1)} {operator} {random_formula(rng, depth + 1)})"  # noqa
+
+
+def outcome(fn):
+    try:
+        return repr(fn())
+    except Exception as exc:
+        return type(exc).__name__
+
+
+def compare_vectorized(formula: str, variables) -> bool:
+    """Per row and vectorized results are the same, or both raise."""
+    def values(fn):
+        try:
+            return [float(value) for value in fn()]
+        except Exception:
+            return None
+    rows = range(len(next(iter(variables.values()))))
+    per_row = values(lambda: [
+        evaluate(formula, {name: values[row] for name, values in variables.items()})  # noqa
+        for row in rows
+    ])
+    vectorized = values(lambda: evaluate_vectorized(formula, variables))
+    if per_row is None or vectorized is None:
+        return per_row is None and vectorized is None
+    return all([
+        math.isclose(a, b, rel_tol=1e-9) or (math.isnan(a) and math.isnan(b))
+        for a, b in zip(per_row, vectorized)
+    ])
+
+
+def same(expected: str, actual: str) -> bool:
+    if expected == actual:
+        return True
+    try:
+        # both nan
+        return math.isnan(float(expected)) and math.isnan(float(actual))
+    except ValueError:
+        return False
+
+
+if __name__ == "__main__":
+    rng = random.Random(42)
+    formulas = [random_formula(rng) for _ in range(5000)]
+    mismatches = [
+        formula for formula in formulas
+        if not same(outcome(lambda: eval(formula, NAMESPACE)), outcome(lambda: evaluate(formula)))  # noqa
+    ]
+    print(f"random formulas: {len(formulas)}, mismatches: {len(mismatches)}")
+    for formula in mismatches[:5]:
+        print(f"  {formula}")
+    mismatches = []
+    for function in [name for name in _FUNCTIONS if name != "_pow"]:
+        for argument_count in (1, 2, 3):
+            formula = f"{function}({', '.join(['a', 'b', 'c'][:argument_count])})"
+            for rows in (1, VECTORIZE_MIN_ROWS - 1, VECTORIZE_MIN_ROWS, 100):
+                variables = {
+                    "a": [rng.uniform(0.5, 100) for _ in range(rows)],
+                    "b": [rng.uniform(0.5, 100) for _ in range(rows)],
+                    "c": [rng.uniform(0.5, 100) for _ in range(rows)],
+                }
+                if not compare_vectorized(formula, variables):
+                    mismatches.append(f"{formula} ({rows} rows)")
+    for formula in [
+        "round(a, 2)", "log(a, 2)", "max(a, b, 50)", "min(2, a, b)",
+        "a * 2**70", "a * 10**20", "a + 2**-1", "a * 10**400", "2**a",
+        "a**2", "a**-2", "a**b", "(a + 1)**0.5", "a * (-2)**63",
+    ]:
+        variables = {
+            "a": [rng.uniform(0.5, 100) for _ in range(100)],
+            "b": [rng.uniform(0.5, 100) for _ in range(100)],
+        }
+        if not compare_vectorized(formula, variables):
+            mismatches.append(formula)
+    print(f"vectorized functions mismatches: {len(mismatches)}")
+    for formula in mismatches[:5]:
+        print(f"  {formula}")
+    rejected = [formula for formula in UNSAFE_FORMULAS if outcome(lambda: evaluate(formula)) == "ValueError"]  # noqa
+    print(f"unsafe formulas rejected: {len(rejected)} / {len(UNSAFE_FORMULAS)}")
+
+    number = 20
+    sample = formulas[:500]
+    eval_time = min(timeit.repeat(
+        lambda: [outcome(lambda: eval(formula, NAMESPACE)) for formula in sample],
+        number=number, repeat=3
+    )) / number / len(sample)
+    compile_formula.cache_clear()
+    cold_time = timeit.timeit(
+        lambda: [outcome(lambda: evaluate(formula)) for formula in sample], number=1
+    ) / len(sample)
+    warm_time = min(timeit.repeat(
+        lambda: [outcome(lambda: evaluate(formula)) for formula in sample],
+        number=number, repeat=3
+    )) / number / len(sample)
+    print(f"{'eval':<28} {eval_time * 1e6:>8.2f} us per formula")
+    print(f"{'evaluate (cold cache)':<28} {cold_time * 1e6:>8.2f} us per formula")
+    print(f"{'evaluate (warm cache)':<28} {warm_time * 1e6:>8.2f} us per formula")
+
+    formula = "round((revenue - cost) / revenue * 100, 2)"
+    for rows in [10, 1000, 100000]:
+        variables = {
+            "revenue": [rng.uniform(100, 200) for _ in range(rows)],
+            "cost": [rng.uniform(50, 100) for _ in range(rows)],
+        }
+        expected = [
+            evaluate(formula, {"revenue": revenue, "cost": cost})
+            for revenue, cost in zip(variables["revenue"], variables["cost"])
+        ]
+        assert all([
+            abs(a - b) <= 0.01 for a, b in zip(expected, evaluate_vectorized(formula, variables))  # noqa
+        ])
+        loop_time = min(timeit.repeat(lambda: [
+            evaluate(formula, {"revenue": revenue, "cost": cost})
+            for revenue, cost in zip(variables["revenue"], variables["cost"])
+        ], number=1, repeat=3))
+        vectorized_time = min(timeit.repeat(
+            lambda: evaluate_vectorized(formula, variables), number=1, repeat=3
+        ))
+        print(
+            f"{rows:>6} rows: per-row {loop_time * 1e3:>8.2f} ms, "
+            f"vectorized {vectorized_time * 1e3:>8.2f} ms "
+            f"({loop_time / vectorized_time:.1f}x)"
+        )
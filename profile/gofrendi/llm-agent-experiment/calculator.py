@@ -0,0 +1,183 @@
+import ast
+import functools
+import math
+from typing import Any, List, Mapping, Optional
+
+# Largest power result (in bits) allowed, so that `9**9**9` can't hang the agent
+MAX_POWER_BITS = 100000
+# Below this number of rows, NumPy's overhead is larger than what it saves
+VECTORIZE_MIN_ROWS = 32
+_BINARY_OPERATORS = (
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow
+)
+_UNARY_OPERATORS = (ast.UAdd, ast.USub)
+
+
+def _pow(base: Any, exponent: Any) -> Any:
+    if isinstance(base, int) and isinstance(exponent, int) and exponent > 0:
+        if max(abs(base).bit_length(), 1) * exponent > MAX_POWER_BITS and abs(base) > 1:  # noqa
+            raise ValueError(f"{base} ** {exponent} is too large")
+    return base ** exponent
+
+
+_CONSTANTS = {"pi": math.pi, "e": math.e}
+_FUNCTIONS = {
+    "_pow": _pow,
+    "abs": abs,
+    "round": round,
+    "min": min,
+    "max": max,
+    "sqrt": math.sqrt,
+    "exp": math.exp,
+    "log": math.log,
+    "log10": math.log10,
+    "floor": math.floor,
+    "ceil": math.ceil,
+}
+
+
+class _FormulaCompiler(ast.NodeTransformer):
+    """Reject everything but arithmetic, and route `**` through `_pow`."""
+
+    def __init__(self, variables: frozenset):
+        self._names = variables | frozenset(_CONSTANTS)
+
+    def generic_visit(self, node: ast.AST) -> ast.AST:
+        if not isinstance(node, (
+            ast.Expression, ast.BinOp, ast.UnaryOp, ast.Constant, ast.Name,
+            ast.Call, ast.Load, *_BINARY_OPERATORS, *_UNARY_OPERATORS
+        )):
+            raise ValueError(f"Unsupported syntax: {type(node).__name__}")
+        return super().generic_visit(node)
+
+    def visit_Constant(self, node: ast.Constant) -> ast.AST:
+        if type(node.value) not in (int, float):
+            raise ValueError(f"Unsupported value: {node.value!r}")
+        return node
+
+    def visit_Name(self, node: ast.Name) -> ast.AST:
+        if node.id not in self._names:
+            raise ValueError(f"Unknown name: {node.id}")
+        return node
+
+    def visit_Call(self, node: ast.Call) -> ast.AST:
+        if not isinstance(node.func, ast.Name) or node.func.id not in _FUNCTIONS or node.func.id == "_pow" or node.keywords:  # noqa
+            raise ValueError(f"Unsupported function call: {ast.unparse(node.func)}")
+        node.args = [self.visit(arg) for arg in node.args]
+        return node
+
+    def visit_BinOp(self, node: ast.BinOp) -> ast.AST:
+        node = self.generic_visit(node)
+        if isinstance(node.op, ast.Pow):
+            return ast.copy_location(ast.Call(
+                func=ast.Name(id="_pow", ctx=ast.Load()),
+                args=[node.left, node.right],
+                keywords=[],
+            ), node)
+        return node
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_formula(formula: str, variables: frozenset = frozenset()) -> Any:
+    """
+    Parse and check a formula once, return its code object.
+    Only numbers, `+ - * / // % **`, parentheses, `pi`, `e`, `variables` and
+    `abs round min max sqrt exp log log10 floor ceil` are allowed.
+    """
+    try:
+        tree = ast.parse(formula.strip(), mode="eval")
+    except SyntaxError as exc:
+        raise ValueError(f"Invalid formula: {exc.msg}")
+    tree = ast.fix_missing_locations(_FormulaCompiler(variables).visit(tree))
+    return compile(tree, "<formula>", "eval")
+
+
+def evaluate(formula: str, variables: Optional[Mapping[str, Any]] = None) -> Any:
+    """Evaluate a formula, the result is the same as `eval` on the allowed subset."""
+    variables = variables if variables is not None else {}
+    code = compile_formula(formula, frozenset(variables))
+    return eval(code, {"__builtins__": {}}, {**_CONSTANTS, **_FUNCTIONS, **variables})  # noqa
+
+
+def evaluate_batch(formulas: List[str]) -> List[Any]:
+    """Evaluate many formulas, each one is compiled once and cached."""
+    return [evaluate(formula) for formula in formulas]
+
+
+def evaluate_vectorized(formula: str, variables: Mapping[str, List[float]]) -> List[Any]:  # noqa
+    """
+    Evaluate one formula for every row of `variables` (name to list of values,
+    all of the same length), e.g. `(revenue - cost) / revenue` over quarters.
+    Large tables are computed with NumPy arrays (float64, division by zero gives
+    inf/nan instead of an error), small ones (or without NumPy) with one
+    `evaluate` per row.
+    """
+    lengths = set([len(values) for values in variables.values()])
+    if len(lengths) > 1:
+        raise ValueError("All variables should have the same number of values")
+    code = compile_formula(formula, frozenset(variables))
+    row_count = lengths.pop() if lengths else 1
+    np = _import_numpy() if row_count >= VECTORIZE_MIN_ROWS else None
+    if np is None:
+        return [
+            evaluate(formula, {name: values[index] for name, values in variables.items()})  # noqa
+            for index in range(row_count)
+        ]
+    namespace = {
+        **_CONSTANTS,
+        **_get_numpy_functions(np),
+        **{name: np.asarray(values, dtype=np.float64) for name, values in variables.items()},  # noqa
+    }
+    with np.errstate(all="ignore"):
+        result = eval(code, {"__builtins__": {}}, namespace)
+    return np.broadcast_to(result, (row_count,)).tolist()
+
+
+def _get_numpy_functions(np: Any) -> Mapping[str, Any]:
+    """
+    NumPy equivalents of `_FUNCTIONS`, with the same arguments. Ufuncs read
+    extra positional arguments as `out`, so every one of them is wrapped.
+    """
+    def unary(ufunc: Any) -> Any:
+        return lambda value: ufunc(value)
+
+    def power(base: Any, exponent: Any) -> Any:
+        # Constant powers (e.g., `2**70`, `2**-1`) are exact, like `evaluate`,
+        # powers of arrays are float64 (int64 would overflow silently)
+        if not isinstance(base, np.ndarray) and not isinstance(exponent, np.ndarray):  # noqa
+            return _pow(base, exponent)
+        return np.power(np.asarray(base, dtype=np.float64), exponent)
+
+    def min_(first: Any, second: Any, *args: Any) -> Any:
+        return functools.reduce(np.minimum, args, np.minimum(first, second))
+
+    def max_(first: Any, second: Any, *args: Any) -> Any:
+        return functools.reduce(np.maximum, args, np.maximum(first, second))
+
+    def log(value: Any, base: Any = None) -> Any:
+        return np.log(value) if base is None else np.log(value) / np.log(base)
+
+    def round_(value: Any, digits: Any = None) -> Any:
+        return np.round(value) if digits is None else np.round(value, digits)
+
+    return {
+        "_pow": power,
+        "abs": unary(np.abs),
+        "round": round_,
+        "min": min_,
+        "max": max_,
+        "sqrt": unary(np.sqrt),
+        "exp": unary(np.exp),
+        "log": log,
+        "log10": unary(np.log10),
+        "floor": unary(np.floor),
+        "ceil": unary(np.ceil),
+    }
+
+
+def _import_numpy() -> Any:
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
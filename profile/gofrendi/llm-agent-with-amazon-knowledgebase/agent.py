@@ -1,10 +1,23 @@
+import asyncio
+import inspect
 import json
-import re
-import litellm
+import time
 import traceback
-from typing import List, Mapping, Any, Callable, Optional
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import List, Literal, Mapping, Any, Callable, Optional, Tuple
 
-from helper import extract_metadata
+from helper import (
+    LRUCache, clear_metadata_cache, get_metadata, get_metadata_key,
+    get_tool_definition, render_function_schemas, render_json, to_dict
+)
+from completion_cache import CompletionCache
+from executor import InlineExecutor, ToolTimeoutError
+from history import get_content, get_role, is_feedback
+from json_extractor import extract_json_object
+from routing import ModelRouter
+from stream_parser import StreamingResponseParser
+from tool_cache import ToolResultCache
+from validator import ArgumentError, clear_validator_cache, get_validator
 
 DEFAULT_SYSTEM_PROMPT: str = """
 You are a helpful assistant.
@@ -39,6 +52,27 @@ If you receive an error:
 
 REMINDER: ALWAYS double-check your response format and function arguments before submitting.
 """.strip()
+DEFAULT_NATIVE_SYSTEM_MESSAGE_TEMPLATE: str = """
+{system_prompt}
+
+Your goal is to find an accurate final_answer by calling the provided functions.
+
+FUNCTION RULES:
+1. Provide ALL required arguments for each function.
+2. Functions that don't depend on each other can be called at the same time.
+3. Use finish_conversation ONLY when you have the final_answer or it's impossible to find one.
+
+If a function returns an error, read it carefully and fix your function call.
+""".strip()
+
+_system_message_cache = LRUCache(max_size=256)
+
+
+def clear_caches():
+    """Clear what Agent construction caches: metadata, validators, system messages."""  # noqa
+    clear_metadata_cache()
+    clear_validator_cache()
+    _system_message_cache.clear()
 
 
 class Agent():
@@ -51,6 +85,28 @@ class Agent():
         previous_messages: Optional[List[Any]] = None,
         tools: List[Callable] = [],
         max_iteration: int = 10,
+        iteration_timeout: Optional[float] = None,
+        parallel_actions: bool = False,
+        max_parallel_actions: int = 4,
+        stream: bool = False,
+        on_thought: Optional[Callable[[str], Any]] = None,
+        schema_format: Literal["json", "minified", "signature"] = "json",
+        history_policy: Optional[Callable[[List[Any]], List[Any]]] = None,
+        tool_cache: Optional[ToolResultCache] = None,
+        completion_cache: Optional[CompletionCache] = None,
+        hooks: Optional[List[Callable[[Mapping[str, Any]], Any]]] = None,
+        verbose: bool = True,
+        function_calling: Literal["text", "native", "auto"] = "text",
+        backend: Optional[Any] = None,
+        hedge_delay: Optional[float] = None,
+        hedge_model: Optional[str] = None,
+        router: Optional[ModelRouter] = None,
+        session_store: Optional[Any] = None,
+        session_id: Optional[str] = None,
+        tool_executor: Optional[Any] = None,
+        tool_executors: Optional[Mapping[str, Any]] = None,
+        prompt_caching: bool = False,
+        cache_control: Optional[bool] = None,
         **kwargs: Mapping[str, Any],
     ):
         def finish_conversation(final_answer: str) -> str:
@@ -60,93 +116,1001 @@ class Agent():
             self._finished = True
             return final_answer
         self._model = model
+        # Prompt caching: the same toolset always gives the same system message
+        # (tools are sorted), new messages are stored as plain dicts with stable
+        # keys, and `cache_control` hints are added when the provider supports
+        # them (None: ask litellm). History policies that rewrite old messages
+        # (e.g., `TruncateToolResults`) reduce the cached prefix.
+        self._prompt_caching = prompt_caching
+        self._cache_control = cache_control
+        self._cache_control_support = {}
+        if prompt_caching:
+            tools = sorted(tools, key=lambda tool: tool.__name__)
         self._tools = [finish_conversation] + tools
         self._max_iteration = max_iteration
+        self._iteration_timeout = iteration_timeout
+        self._parallel_actions = parallel_actions
+        self._max_parallel_actions = max_parallel_actions
+        self._stream = stream
+        self._on_thought = on_thought
+        self._schema_format = schema_format
+        self._history_policy = history_policy
+        self._tool_cache = tool_cache
+        self._completion_cache = completion_cache
+        self._hooks = hooks if hooks is not None else []
+        self._router = router
+        # Where sync tools run (see `executor.py`): `tool_executor` by default,
+        # `tool_executors` per function name. finish_conversation and coroutine
+        # tools always run inline.
+        self._inline_executor = InlineExecutor()
+        self._tool_executor = tool_executor if tool_executor is not None else self._inline_executor  # noqa
+        self._tool_executors = tool_executors if tool_executors is not None else {}
+        if router is not None:
+            self._hooks = [router] + self._hooks
+        self._verbose = verbose
+        # Anything providing litellm's `completion`, `acompletion` and
+        # `stream_chunk_builder` (e.g., `fake_llm.FakeLLM` for offline benchmarks)
+        # litellm itself is only imported on the first completion
+        self._backend = backend
+        # Hedged requests (disabled when `hedge_delay` is None, ignored when
+        # streaming): without a valid response after `hedge_delay` seconds, the
+        # request is also sent to `hedge_model` (default: the same model)
+        self._hedge_delay = hedge_delay
+        self._hedge_model = hedge_model
+        self._response_model = model
+        self._iteration = 0
+        self._early_calls = {}
+        # Whether the last completion was streamed (not taken from the cache)
+        self._streamed = False
         self._kwargs = kwargs
         self._return = ""
+        self._native_function_calling = self._is_native_function_calling(
+            function_calling
+        )
+        if system_message_template is None and self._native_function_calling:
+            system_message_template = DEFAULT_NATIVE_SYSTEM_MESSAGE_TEMPLATE
         if system_message_template is None:
             system_message_template = DEFAULT_SYSTEM_MESSAGE_TEMPLATE
         if system_prompt is None:
             system_prompt = DEFAULT_SYSTEM_PROMPT
         self._function_schemas = {
-            fn.__name__: extract_metadata(fn) for fn in self._tools
+            fn.__name__: get_metadata(fn) for fn in self._tools
         }
         self._function_names = [key for key in self._function_schemas]
         self._function_map = {fn.__name__: fn for fn in self._tools}
+        self._validators = {fn.__name__: get_validator(fn) for fn in self._tools}
+        if self._native_function_calling:
+            self._kwargs = {
+                "tools": [
+                    get_tool_definition(self._function_schemas[function_name])
+                    for function_name in self._function_names
+                ],
+                **self._kwargs,
+            }
         function_names_str = ", ".join([f"`{key}`" for key in self._function_names])
-        self._response_format = {
-            "thought": "<your plan and reasoning to choose an action>",
-            "action": {
-                "function": f"<function name, SHOULD STRICTLY be one of these: {function_names_str}>",  # noqa
-                "arguments": {
-                    "<argument-1>": "<value-1>",
-                    "<argument-2>": "<value-2>",
-                }
+        action_format = {
+            "function": f"<function name, SHOULD STRICTLY be one of these: {function_names_str}>",  # noqa
+            "arguments": {
+                "<argument-1>": "<value-1>",
+                "<argument-2>": "<value-2>",
             }
         }
+        if parallel_actions:
+            self._response_format = {
+                "thought": "<your plan and reasoning to choose the actions, actions that don't depend on each other SHOULD be sent together>",  # noqa
+                "actions": [action_format, action_format],
+            }
+        else:
+            self._response_format = {
+                "thought": "<your plan and reasoning to choose an action>",
+                "action": action_format,
+            }
         self._system_message = {
             "role": "system",
-            "content": system_message_template.format(
-                system_prompt=system_prompt,
-                response_format=json.dumps(self._response_format, indent=2),
-                function_names=json.dumps(self._function_names),
-                function_schemas=json.dumps(self._function_schemas, indent=2),
+            "content": self._get_system_message_content(
+                system_message_template, system_prompt
             ),
         }
+        # Every new message is also appended to `session_store` (see
+        # `session_store.py`), the stored history is loaded (lazily) unless
+        # `previous_messages` is given
+        self._session_store = session_store
+        self._session_id = session_id
+        history_models = None
+        if session_store is not None and previous_messages is None:
+            previous_messages, history_models = session_store.load(session_id)
         self._previous_messages = previous_messages if previous_messages is not None else []  # noqa
-        self._messages = [self._system_message] + self._previous_messages
+        # Model that produced each message of the history (None for other roles)
+        self._history_models = history_models if history_models is not None else [
+            None for _ in self._previous_messages
+        ]
         self._finished = False
 
+    def _is_native_function_calling(self, function_calling: str) -> bool:
+        if function_calling == "native":
+            return True
+        if function_calling == "auto":
+            try:
+                return _import_litellm().supports_function_calling(model=self._model)  # noqa
+            except Exception:
+                return False
+        return False
+
+    def _get_system_message_content(
+        self, system_message_template: Any, system_prompt: Any
+    ) -> str:
+        key = (
+            system_message_template,
+            system_prompt,
+            self._parallel_actions,
+            self._schema_format,
+            tuple(get_metadata_key(fn) for fn in self._tools),
+        )
+        content = _system_message_cache.get(key)
+        if content is None:
+            content = system_message_template.format(
+                system_prompt=system_prompt,
+                response_format=render_json(self._response_format, self._schema_format),  # noqa
+                function_names=json.dumps(self._function_names),
+                function_schemas=render_function_schemas(
+                    self._function_schemas, self._schema_format
+                ),
+            )
+            _system_message_cache.set(key, content)
+        return content
+
     def get_system_messages(self) -> Any:
         return self._system_message
 
     def get_history(self) -> List[Any]:
         return self._previous_messages
 
-    def add_user_message(self, user_message: Any) -> List[Any]:
-        self._append_message({"role": "user", "content": user_message})
-        print("📜 System prompt")
-        print(self.get_system_messages()["content"])
-        print("📜 Previous messages")
-        for previous_message in self.get_history():
-            print(previous_message)
-        for i in range(self._max_iteration):
-            response = litellm.completion(
-                model=self._model, messages=self._messages, **self._kwargs
-            )
-            response_message = response.choices[0].message
-            print("🤖 Response", response_message)
+    def get_history_models(self) -> List[Optional[str]]:
+        """Model that produced each message of `get_history()`, None for non-LLM messages."""  # noqa
+        return self._history_models
+
+    def add_user_message(self, user_message: Any) -> Any:
+        conversation_start = self._start_conversation(user_message)
+        return self._run_conversation(conversation_start)
+
+    def resume(self) -> Any:
+        """
+        Continue an interrupted `add_user_message` loop from the stored history
+        (see `session_store`). Actions of the last response are executed if their
+        results were not stored, then the loop goes on with the remaining
+        iterations. The final answer is returned right away if the conversation
+        is already finished.
+        """
+        conversation_start = self._start_conversation(None)
+        self._iteration = self._get_completed_iterations()
+        pending = self._get_pending_step()
+        result = None
+        if pending is not None and pending[0] == "finished":
+            self._finished = True
+            result = pending[1]
+        elif pending is not None and pending[0] == "tool_calls":
+            result = self._handle_tool_calls(pending[1], self._call_functions([
+                (tool_call["function"], tool_call["arguments"]) for tool_call in pending[1]  # noqa
+            ]))
+        elif pending is not None and self._parallel_actions:
+            result = self._run_actions(pending[1])
+        elif pending is not None:
+            result = self._run_action(*pending[1][0])
+        if self._finished:
+            self._end_conversation(conversation_start)
+            return result
+        return self._run_conversation(conversation_start)
+
+    def _run_conversation(self, conversation_start: float) -> Any:
+        for i in range(self._iteration, self._max_iteration):
+            self._iteration = i + 1
+            iteration_start = time.perf_counter()
+            result = self._run_iteration()
+            self._emit("iteration", duration=time.perf_counter() - iteration_start)
+            if self._finished:
+                self._end_conversation(conversation_start)
+                return result
+        self._end_conversation(conversation_start)
+        return None
+
+    def _run_iteration(self) -> Any:
+        start = time.perf_counter()
+        response = self._completion()
+        self._emit_completion(response, start)
+        response_message = response.choices[0].message
+        if self._has_tool_calls(response_message):
+            tool_calls = self._handle_tool_calls_message(response_message)
+            return self._handle_tool_calls(tool_calls, self._call_functions([
+                (tool_call["function"], tool_call["arguments"]) for tool_call in tool_calls
+            ]))
+        response_map = self._handle_response_message(response_message)
+        if response_map is None:
+            return None
+        actions = self._get_actions(response_map)
+        if self._parallel_actions:
+            return self._run_actions(actions)
+        return self._run_action(*actions[0])
+
+    async def add_user_message_async(self, user_message: Any) -> Any:
+        """
+        Asyncio version of `add_user_message`.
+
+        The completion is requested with `litellm.acompletion`, coroutine tools are
+        awaited and sync tools run in the default thread pool, so a single event
+        loop can drive many conversations (one Agent per conversation).
+        Every iteration is bounded by `iteration_timeout` (if set). A timed out
+        iteration is reported back to the LLM as feedback error. Cancelling the
+        task stops the loop right away. In both cases, native tool calls left
+        without result are answered with an error, so the history stays valid.
+        """
+        conversation_start = self._start_conversation(user_message)
+        return await self._run_conversation_async(conversation_start)
+
+    async def resume_async(self) -> Any:
+        """Asyncio version of `resume`."""
+        conversation_start = self._start_conversation(None)
+        self._iteration = self._get_completed_iterations()
+        pending = self._get_pending_step()
+        result = None
+        if pending is not None and pending[0] == "finished":
+            self._finished = True
+            result = pending[1]
+        elif pending is not None and pending[0] == "tool_calls":
+            result = self._handle_tool_calls(pending[1], await self._call_functions_async([  # noqa
+                (tool_call["function"], tool_call["arguments"]) for tool_call in pending[1]  # noqa
+            ]))
+        elif pending is not None and self._parallel_actions:
+            result = await self._run_actions_async(pending[1])
+        elif pending is not None:
+            result = await self._run_action_async(*pending[1][0])
+        if self._finished:
+            self._end_conversation(conversation_start)
+            return result
+        return await self._run_conversation_async(conversation_start)
+
+    async def _run_conversation_async(self, conversation_start: float) -> Any:
+        for i in range(self._iteration, self._max_iteration):
+            self._iteration = i + 1
+            iteration_start = time.perf_counter()
             try:
-                response_map = self._extract_agent_message(response_message.content)
-                self._validate_agent_message(response_map)
-                self._append_message({
-                    "role": "assistant", "content": json.dumps(response_map)
+                result = await asyncio.wait_for(
+                    self._run_iteration_async(), timeout=self._iteration_timeout
+                )
+            except asyncio.TimeoutError:
+                exc = self._map_to_exception({
+                    "error": "TIMEOUT",
+                    "details": f"The step took more than {self._iteration_timeout} seconds",  # noqa
+                    "action_required": "Try again, or choose a faster approach",
                 })
-            except Exception as exc:
-                print("🛑 Error", f"{exc}")
-                traceback.print_exc()
-                self._append_message(response_message)
+                self._print("🛑 Error", f"{exc}")
+                self._emit("timeout", timeout=self._iteration_timeout)
+                self._append_missing_tool_results(exc)
                 self._append_feedback_error(exc)
                 continue
-            print("🥝 Response map", response_map)
-            action = response_map.get("action", {})
-            function_name = action.get("function", "")
-            function_kwargs = action.get("arguments", {})
-            result = None
-            try:
-                self._validate_function_call(function_name, function_kwargs)
-                result = self._execute_function(function_name, function_kwargs)
-                print("✅ Result", result)
-                self._append_function_call_ok(function_name, function_kwargs, result)
-            except Exception as exc:
-                print("🛑 Error", f"{exc}")
-                traceback.print_exc()
-                self._append_function_call_error(function_name, function_kwargs, exc)
+            except asyncio.CancelledError:
+                self._append_missing_tool_results(self._map_to_exception({
+                    "error": "CANCELLED",
+                    "details": "The request was cancelled before the tool returned",  # noqa
+                    "action_required": "Call the tool again if it is still needed",  # noqa
+                }))
+                raise
+            finally:
+                self._emit("iteration", duration=time.perf_counter() - iteration_start)
             if self._finished:
+                self._end_conversation(conversation_start)
                 return result
+        self._end_conversation(conversation_start)
+        return None
+
+    async def _run_iteration_async(self) -> Any:
+        start = time.perf_counter()
+        response = await self._completion_async()
+        self._emit_completion(response, start)
+        response_message = response.choices[0].message
+        if self._has_tool_calls(response_message):
+            tool_calls = self._handle_tool_calls_message(response_message)
+            return self._handle_tool_calls(tool_calls, await self._call_functions_async([
+                (tool_call["function"], tool_call["arguments"]) for tool_call in tool_calls
+            ]))
+        response_map = self._handle_response_message(response_message)
+        if response_map is None:
+            return None
+        actions = self._get_actions(response_map)
+        if self._parallel_actions:
+            return await self._run_actions_async(actions)
+        return await self._run_action_async(*actions[0])
+
+    def _completion(self) -> Any:
+        messages = self._get_request_messages()
+        model = self._get_model(messages)
+        messages = self._add_cache_control(model, messages)
+        self._response_model = model
+        if self._hedge_delay is not None and not self._stream:
+            return self._hedged_completion(model, messages)
+        if not self._stream:
+            return self._request_completion(model, messages)
+        if self._completion_cache is not None:
+            # The assembled response is cached, only a miss is streamed
+            return self._replay_stream(self._completion_cache.completion(
+                self._stream_completion, model=model, messages=messages, **self._kwargs  # noqa
+            ))
+        return self._stream_completion(model, messages, **self._kwargs)
+
+    def _stream_completion(self, model: str, messages: List[Any], **kwargs: Any) -> Any:  # noqa
+        self._early_calls = {}
+        executor = ThreadPoolExecutor(max_workers=self._max_parallel_actions)
+        parser = StreamingResponseParser(
+            on_thought=self._on_thought,
+            on_action=lambda action: self._dispatch_early_call(
+                action,
+                lambda function_name, function_kwargs: executor.submit(
+                    self._validate_and_execute, function_name, function_kwargs
+                )
+            ),
+        )
+        chunks = []
+        try:
+            response = self._get_backend().completion(
+                model=model, messages=messages, stream=True, **kwargs
+            )
+            for chunk in response:
+                chunks.append(chunk)
+                parser.feed(chunk.choices[0].delta.content or "")
+        finally:
+            executor.shutdown(wait=False)
+        self._streamed = True
+        return self._get_backend().stream_chunk_builder(chunks, messages=messages)
+
+    async def _completion_async(self) -> Any:
+        messages = self._get_request_messages()
+        model = self._get_model(messages)
+        messages = self._add_cache_control(model, messages)
+        self._response_model = model
+        if self._hedge_delay is not None and not self._stream:
+            return await self._hedged_completion_async(model, messages)
+        if not self._stream:
+            return await self._request_completion_async(model, messages)
+        if self._completion_cache is not None:
+            return self._replay_stream(await self._completion_cache.acompletion(
+                self._stream_completion_async, model=model, messages=messages, **self._kwargs  # noqa
+            ))
+        return await self._stream_completion_async(model, messages, **self._kwargs)
+
+    async def _stream_completion_async(self, model: str, messages: List[Any], **kwargs: Any) -> Any:  # noqa
+        self._cancel_early_calls()
+        parser = StreamingResponseParser(
+            on_thought=self._on_thought,
+            on_action=lambda action: self._dispatch_early_call(
+                action,
+                lambda function_name, function_kwargs: asyncio.ensure_future(
+                    self._validate_and_execute_async(function_name, function_kwargs)
+                )
+            ),
+        )
+        chunks = []
+        response = await self._get_backend().acompletion(
+            model=model, messages=messages, stream=True, **kwargs
+        )
+        async for chunk in response:
+            chunks.append(chunk)
+            parser.feed(chunk.choices[0].delta.content or "")
+        self._streamed = True
+        return self._get_backend().stream_chunk_builder(chunks, messages=messages)
+
+    def _replay_stream(self, response: Any) -> Any:
+        # A cached response was not streamed, its thought is reported at once
+        if not self._streamed and self._on_thought is not None:
+            StreamingResponseParser(on_thought=self._on_thought).feed(
+                get_content(response.choices[0].message) or ""
+            )
+        self._streamed = False
+        return response
+
+    def _request_completion(self, model: str, messages: List[Any]) -> Any:
+        if self._completion_cache is not None:
+            return self._completion_cache.completion(
+                self._get_backend().completion,
+                model=model, messages=messages, **self._kwargs
+            )
+        return self._get_backend().completion(
+            model=model, messages=messages, **self._kwargs
+        )
+
+    async def _request_completion_async(self, model: str, messages: List[Any]) -> Any:
+        if self._completion_cache is not None:
+            return await self._completion_cache.acompletion(
+                self._get_backend().acompletion,
+                model=model, messages=messages, **self._kwargs
+            )
+        return await self._get_backend().acompletion(
+            model=model, messages=messages, **self._kwargs
+        )
+
+    def _hedged_completion(self, model: str, messages: List[Any]) -> Any:
+        """
+        Race `model` against the hedge model, the hedge request is sent after
+        `hedge_delay` seconds, or as soon as the first response is invalid.
+        The first valid response wins, the other one is abandoned.
+        """
+        hedge_model = self._hedge_model if self._hedge_model is not None else model
+        executor = ThreadPoolExecutor(max_workers=2)
+        futures = {executor.submit(self._request_completion, model, messages): model}
+        completed = []
+        pending = set(futures)
+        try:
+            while len(pending) > 0:
+                hedged = len(futures) > 1
+                done, pending = wait(
+                    pending,
+                    timeout=None if hedged else self._hedge_delay,
+                    return_when=FIRST_COMPLETED,
+                )
+                for future in done:
+                    completed.append((futures[future], future))
+                    if future.exception() is None and self._is_valid_response(future.result()):  # noqa
+                        return self._resolve_hedge(futures, future, future.result())
+                if not hedged:
+                    future = executor.submit(
+                        self._request_completion, hedge_model, messages
+                    )
+                    futures[future] = hedge_model
+                    pending.add(future)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        return self._resolve_failed_hedge(futures, [
+            (request_model, future.result() if future.exception() is None else None, future.exception())  # noqa
+            for request_model, future in completed
+        ])
+
+    async def _hedged_completion_async(self, model: str, messages: List[Any]) -> Any:
+        """Asyncio version of `_hedged_completion`, the losing request is cancelled."""  # noqa
+        hedge_model = self._hedge_model if self._hedge_model is not None else model
+        tasks = {
+            asyncio.ensure_future(self._request_completion_async(model, messages)): model
+        }
+        completed = []
+        pending = set(tasks)
+        try:
+            while len(pending) > 0:
+                hedged = len(tasks) > 1
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=None if hedged else self._hedge_delay,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    completed.append((tasks[task], task))
+                    if task.exception() is None and self._is_valid_response(task.result()):  # noqa
+                        return self._resolve_hedge(tasks, task, task.result())
+                if not hedged:
+                    task = asyncio.ensure_future(
+                        self._request_completion_async(hedge_model, messages)
+                    )
+                    tasks[task] = hedge_model
+                    pending.add(task)
+        finally:
+            for task in tasks:
+                task.cancel()
+        return self._resolve_failed_hedge(tasks, [
+            (request_model, task.result() if task.exception() is None else None, task.exception())  # noqa
+            for request_model, task in completed
+        ])
+
+    def _resolve_hedge(self, requests: Mapping[Any, str], request: Any, response: Any) -> Any:  # noqa
+        # `requests` maps every future/task to its model, the primary comes first
+        self._response_model = requests[request]
+        if len(requests) > 1:
+            winner = "primary" if request is next(iter(requests)) else "hedge"
+            self._emit("hedge", model=list(requests.values())[1], winner=winner)
+        return response
+
+    def _resolve_failed_hedge(
+        self,
+        requests: Mapping[Any, str],
+        outcomes: List[Tuple[str, Any, Optional[BaseException]]],
+    ) -> Any:
+        # No valid response, keep the first successful one so that the usual
+        # feedback error is sent to the LLM
+        if len(requests) > 1:
+            self._emit("hedge", model=list(requests.values())[1], winner=None)
+        for model, response, exc in outcomes:
+            if exc is None:
+                self._response_model = model
+                return response
+        raise outcomes[0][2]
+
+    def _is_valid_response(self, response: Any) -> bool:
+        response_message = response.choices[0].message
+        if self._has_tool_calls(response_message):
+            return True
+        try:
+            self._validate_agent_message(
+                self._extract_agent_message(response_message.content)
+            )
+        except Exception:
+            return False
+        return True
+
+    def _get_backend(self) -> Any:
+        if self._backend is None:
+            self._backend = _import_litellm()
+        return self._backend
+
+    def _get_model(self, messages: List[Any]) -> str:
+        if self._router is None:
+            return self._model
+        return self._router.get_model(self._model, messages)
+
+    def _add_cache_control(self, model: str, messages: List[Any]) -> List[Any]:
+        """
+        Mark the system message (stable prefix) and the last message (the
+        conversation so far) as cacheable, as content blocks with `cache_control`.
+        """
+        if not self._prompt_caching or not self._supports_cache_control(model):
+            return messages
+        return [
+            _with_cache_control(message)
+            if index == 0 or (index == len(messages) - 1 and get_role(message) == "user")  # noqa
+            else message
+            for index, message in enumerate(messages)
+        ]
+
+    def _supports_cache_control(self, model: str) -> bool:
+        if self._cache_control is not None:
+            return self._cache_control
+        if model not in self._cache_control_support:
+            try:
+                supported = _import_litellm().supports_prompt_caching(model=model)  # noqa
+            except Exception:
+                # Unknown model, or litellm without prompt caching support
+                supported = False
+            self._cache_control_support[model] = supported
+        return self._cache_control_support[model]
+
+    def _get_request_messages(self) -> List[Any]:
+        if self._history_policy is None:
+            return [self._system_message, *self._previous_messages]
+        return [self._system_message, *self._history_policy(self._previous_messages)]
+
+    def _dispatch_early_call(
+        self, action: Mapping[str, Any], submit: Callable[[str, Mapping[str, Any]], Any]
+    ):
+        """
+        Start a streamed action before the whole response is generated.
+        The result is picked up by `_call_function` if the final response contains
+        the same call. `finish_conversation` is never started early.
+        """
+        if len(self._get_action_error_details(action, "`action`")) > 0:
+            return
+        function_name, function_kwargs = action["function"], action["arguments"]
+        if function_name == "finish_conversation":
+            return
+        try:
+            self._validate_function_call(function_name, function_kwargs)
+        except Exception:
+            return
+        key = self._get_call_key(function_name, function_kwargs)
+        if key not in self._early_calls:
+            self._early_calls[key] = submit(function_name, function_kwargs)
+
+    def _pop_early_call(self, function_name: str, function_kwargs: Mapping[str, Any]) -> Any:  # noqa
+        return self._early_calls.pop(
+            self._get_call_key(function_name, function_kwargs), None
+        )
+
+    def _cancel_early_calls(self):
+        for early_call in self._early_calls.values():
+            early_call.cancel()
+        self._early_calls = {}
+
+    def _get_call_key(self, function_name: str, function_kwargs: Mapping[str, Any]) -> str:  # noqa
+        return json.dumps([function_name, function_kwargs], sort_keys=True, default=str)
+
+    def _start_conversation(self, user_message: Optional[Any]) -> float:
+        # `user_message` is None when resuming a conversation
+        self._finished = False
+        self._iteration = 0
+        if user_message is not None:
+            self._append_message({"role": "user", "content": user_message})
+        self._print("📜 System prompt")
+        self._print(self.get_system_messages()["content"])
+        self._print("📜 Previous messages")
+        if self._verbose:
+            # Don't decode a lazily loaded history for nothing
+            for previous_message in self.get_history():
+                self._print(previous_message)
+        self._emit("conversation_start")
+        return time.perf_counter()
+
+    def _end_conversation(self, conversation_start: float):
+        self._emit(
+            "conversation_end",
+            iterations=self._iteration,
+            duration=time.perf_counter() - conversation_start,
+            finished=self._finished,
+        )
         self._finished = False
+
+    def _handle_response_message(self, response_message: Any) -> Optional[Mapping[str, Any]]:  # noqa
+        self._print("🤖 Response", response_message)
+        start = time.perf_counter()
+        try:
+            response_map = self._extract_agent_message(response_message.content)
+            self._validate_agent_message(response_map)
+            self._append_message({
+                "role": "assistant", "content": json.dumps(response_map)
+            })
+        except Exception as exc:
+            self._emit(
+                "parse",
+                duration=time.perf_counter() - start,
+                ok=False,
+                error=self._get_error_code(exc),
+            )
+            self._print("🛑 Error", f"{exc}")
+            self._print_exception(exc)
+            self._append_message(response_message)
+            self._append_feedback_error(exc)
+            return None
+        self._emit("parse", duration=time.perf_counter() - start, ok=True, error=None)
+        self._print("🥝 Response map", response_map)
+        return response_map
+
+    def _emit(self, event: str, **data: Any):
+        if len(self._hooks) == 0:
+            return
+        payload = {
+            "event": event, "time": time.time(), "iteration": self._iteration, **data
+        }
+        for hook in self._hooks:
+            try:
+                hook(payload)
+            except Exception as exc:
+                self._print("🛑 Hook error", f"{exc}")
+
+    def _emit_completion(self, response: Any, start: float):
+        if len(self._hooks) == 0:
+            return
+        self._emit(
+            "completion",
+            model=self._response_model,
+            duration=time.perf_counter() - start,
+            usage=self._get_usage(response),
+        )
+
+    def _get_usage(self, response: Any) -> Mapping[str, Any]:
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return {}
+        if isinstance(usage, dict):
+            get_value = usage.get
+        else:
+            def get_value(key):
+                return getattr(usage, key, None)
+        prompt_tokens_details = get_value("prompt_tokens_details")
+        cached_tokens = get_value("cache_read_input_tokens")
+        if prompt_tokens_details is not None:
+            if isinstance(prompt_tokens_details, dict):
+                cached_tokens = prompt_tokens_details.get("cached_tokens")
+            else:
+                cached_tokens = getattr(prompt_tokens_details, "cached_tokens", None)
+        return {
+            "prompt_tokens": get_value("prompt_tokens"),
+            "completion_tokens": get_value("completion_tokens"),
+            "total_tokens": get_value("total_tokens"),
+            "cached_tokens": cached_tokens,
+            # Anthropic: prompt tokens written to the cache
+            "cache_creation_tokens": get_value("cache_creation_input_tokens"),
+        }
+
+    def _get_error_code(self, exc: Exception) -> Any:
+        error = self._extract_exception(exc)
+        if isinstance(error, dict):
+            return error.get("error", "UNKNOWN")
+        return "UNKNOWN"
+
+    def _print(self, *args: Any):
+        if self._verbose:
+            print(*args)
+
+    def _print_exception(self, exc: Exception):
+        if self._verbose:
+            traceback.print_exception(exc)
+
+    def _get_actions(self, response_map: Mapping[str, Any]) -> List[Tuple[str, Mapping[str, Any]]]:  # noqa
+        # `actions` is only validated (and expected) in parallel actions mode
+        if self._parallel_actions and "actions" in response_map:
+            actions = response_map["actions"]
+        else:
+            actions = [response_map.get("action", {})]
+        return [
+            (action.get("function", ""), action.get("arguments", {}))
+            for action in actions
+        ]
+
+    def _run_action(self, function_name: str, function_kwargs: Mapping[str, Any]) -> Any:  # noqa
+        result, exc = self._call_function(function_name, function_kwargs)
+        return self._handle_function_call(function_name, function_kwargs, result, exc)
+
+    async def _run_action_async(
+        self, function_name: str, function_kwargs: Mapping[str, Any]
+    ) -> Any:
+        result, exc = await self._call_function_async(function_name, function_kwargs)
+        return self._handle_function_call(function_name, function_kwargs, result, exc)
+
+    def _run_actions(self, actions: List[Tuple[str, Mapping[str, Any]]]) -> Any:
+        return self._handle_function_calls(actions, self._call_functions(actions))
+
+    async def _run_actions_async(self, actions: List[Tuple[str, Mapping[str, Any]]]) -> Any:  # noqa
+        outcomes = await self._call_functions_async(actions)
+        return self._handle_function_calls(actions, outcomes)
+
+    def _call_functions(
+        self, actions: List[Tuple[str, Mapping[str, Any]]]
+    ) -> List[Tuple[Any, Optional[Exception]]]:
+        if len(actions) == 1:
+            return [self._call_function(*actions[0])]
+        with ThreadPoolExecutor(max_workers=self._max_parallel_actions) as executor:
+            return list(executor.map(
+                lambda action: self._call_function(*action), actions
+            ))
+
+    async def _call_functions_async(
+        self, actions: List[Tuple[str, Mapping[str, Any]]]
+    ) -> List[Tuple[Any, Optional[Exception]]]:
+        semaphore = asyncio.Semaphore(self._max_parallel_actions)
+
+        async def call_function(function_name: str, function_kwargs: Mapping[str, Any]):  # noqa
+            async with semaphore:
+                return await self._call_function_async(function_name, function_kwargs)
+        return await asyncio.gather(*[
+            call_function(function_name, function_kwargs)
+            for function_name, function_kwargs in actions
+        ])
+
+    def _has_tool_calls(self, response_message: Any) -> bool:
+        return self._native_function_calling and bool(
+            getattr(response_message, "tool_calls", None)
+        )
+
+    def _handle_tool_calls_message(self, response_message: Any) -> List[Mapping[str, Any]]:  # noqa
+        """
+        Record a native function calling response and parse its tool calls.
+        Invalid JSON arguments are kept as string, so that the validator reports them.
+        """
+        self._print("🤖 Response", response_message)
+        start = time.perf_counter()
+        tool_calls = self._parse_tool_calls(response_message.tool_calls)
+        self._append_message({
+            "role": "assistant",
+            "content": response_message.content,
+            "tool_calls": [
+                {
+                    "id": tool_call["id"],
+                    "type": "function",
+                    "function": {
+                        "name": tool_call["function"],
+                        "arguments": tool_call["raw_arguments"],
+                    },
+                }
+                for tool_call in tool_calls
+            ],
+        })
+        self._emit("parse", duration=time.perf_counter() - start, ok=True, error=None)
+        return tool_calls
+
+    def _parse_tool_calls(self, raw_tool_calls: List[Any]) -> List[Mapping[str, Any]]:
+        # Tool calls are litellm objects, or dicts when loaded from a session store
+        tool_calls = []
+        for tool_call in raw_tool_calls:
+            if isinstance(tool_call, dict):
+                tool_call_id = tool_call["id"]
+                function_name = tool_call["function"]["name"]
+                raw_arguments = tool_call["function"].get("arguments") or "{}"
+            else:
+                tool_call_id = tool_call.id
+                function_name = tool_call.function.name
+                raw_arguments = tool_call.function.arguments or "{}"
+            try:
+                arguments = json.loads(raw_arguments)
+            except Exception:
+                arguments = {"__raw_arguments__": raw_arguments}
+            tool_calls.append({
+                "id": tool_call_id,
+                "function": function_name,
+                "arguments": arguments,
+                "raw_arguments": raw_arguments,
+            })
+        return tool_calls
+
+    def _get_completed_iterations(self) -> int:
+        # LLM responses since the last question
+        iterations = 0
+        for message in reversed(self._previous_messages):
+            role = get_role(message)
+            if role == "user" and not is_feedback(message):
+                break
+            if role == "assistant":
+                iterations += 1
+        return iterations
+
+    def _get_pending_step(self) -> Optional[Tuple[str, Any]]:
+        """
+        What is left of the last iteration of a stored conversation:
+        - `("finished", final_answer)`
+        - `("tool_calls", tool_calls)`: native tool calls without result
+        - `("actions", actions)`: actions of the last response without feedback
+        - None: the last message is a question or a feedback, ask the LLM
+        """
+        messages = self._previous_messages
+        index = len(messages) - 1
+        while index >= 0 and get_role(messages[index]) == "tool":
+            index -= 1
+        if index < 0:
+            return None
+        last_response = messages[index]
+        tool_results = messages[index + 1:]
+        for tool_result in tool_results:
+            if _get_field(tool_result, "name") == "finish_conversation":
+                return ("finished", get_content(tool_result))
+        if get_role(last_response) == "user":
+            final_answer = _get_final_answer(last_response)
+            return None if final_answer is None else ("finished", final_answer[0])
+        if get_role(last_response) != "assistant":
+            return None
+        raw_tool_calls = _get_field(last_response, "tool_calls")
+        if raw_tool_calls:
+            done = set([_get_field(tool_result, "tool_call_id") for tool_result in tool_results])  # noqa
+            return ("tool_calls", [
+                tool_call for tool_call in self._parse_tool_calls(raw_tool_calls)
+                if tool_call["id"] not in done
+            ])
+        try:
+            response_map = self._extract_agent_message(get_content(last_response))
+            self._validate_agent_message(response_map)
+        except Exception as exc:
+            self._append_feedback_error(exc)
+            return None
+        return ("actions", self._get_actions(response_map))
+
+    def _append_missing_tool_results(self, exc: Exception):
+        # Providers reject a history where a tool call has no result
+        messages = self._previous_messages
+        index = len(messages) - 1
+        while index >= 0 and get_role(messages[index]) == "tool":
+            index -= 1
+        if index < 0 or get_role(messages[index]) != "assistant":
+            return
+        raw_tool_calls = _get_field(messages[index], "tool_calls")
+        if not raw_tool_calls:
+            return
+        done = set([_get_field(tool_result, "tool_call_id") for tool_result in messages[index + 1:]])  # noqa
+        missing = [
+            tool_call for tool_call in self._parse_tool_calls(raw_tool_calls)
+            if tool_call["id"] not in done
+        ]
+        self._handle_tool_calls(missing, [(None, exc)] * len(missing))
+
+    def _handle_tool_calls(
+        self,
+        tool_calls: List[Mapping[str, Any]],
+        outcomes: List[Tuple[Any, Optional[Exception]]],
+    ) -> Any:
+        final_result = None
+        for tool_call, (result, exc) in zip(tool_calls, outcomes):
+            function_name = tool_call["function"]
+            if exc is None:
+                self._print("✅ Result", function_name, result)
+                content = result if isinstance(result, str) else json.dumps(result)
+                if function_name == "finish_conversation":
+                    final_result = result
+            else:
+                self._print("🛑 Error", function_name, f"{exc}")
+                self._print_exception(exc)
+                content = json.dumps(self._extract_exception(exc))
+            self._append_message({
+                "role": "tool",
+                "tool_call_id": tool_call["id"],
+                "name": function_name,
+                "content": content,
+            })
+        return final_result
+
+    def _call_function(
+        self, function_name: str, function_kwargs: Mapping[str, Any]
+    ) -> Tuple[Any, Optional[Exception]]:
+        early_call = self._pop_early_call(function_name, function_kwargs)
+        if early_call is not None:
+            return early_call.result()
+        return self._validate_and_execute(function_name, function_kwargs)
+
+    async def _call_function_async(
+        self, function_name: str, function_kwargs: Mapping[str, Any]
+    ) -> Tuple[Any, Optional[Exception]]:
+        early_call = self._pop_early_call(function_name, function_kwargs)
+        if early_call is not None:
+            return await early_call
+        return await self._validate_and_execute_async(function_name, function_kwargs)
+
+    def _validate_and_execute(
+        self, function_name: str, function_kwargs: Mapping[str, Any]
+    ) -> Tuple[Any, Optional[Exception]]:
+        start = time.perf_counter()
+        try:
+            function_kwargs = self._validate_function_call(function_name, function_kwargs)
+            outcome = self._execute_function(function_name, function_kwargs), None
+        except Exception as exc:
+            outcome = None, exc
+        self._emit_tool(function_name, outcome[1], start)
+        return outcome
+
+    async def _validate_and_execute_async(
+        self, function_name: str, function_kwargs: Mapping[str, Any]
+    ) -> Tuple[Any, Optional[Exception]]:
+        start = time.perf_counter()
+        try:
+            function_kwargs = self._validate_function_call(function_name, function_kwargs)
+            outcome = await self._execute_function_async(function_name, function_kwargs), None  # noqa
+        except Exception as exc:
+            outcome = None, exc
+        self._emit_tool(function_name, outcome[1], start)
+        return outcome
+
+    def _emit_tool(self, function_name: str, exc: Optional[Exception], start: float):
+        self._emit(
+            "tool",
+            function=function_name,
+            duration=time.perf_counter() - start,
+            ok=exc is None,
+            error=None if exc is None else self._get_error_code(exc),
+        )
+
+    def _handle_function_call(
+        self,
+        function_name: str,
+        arguments: Mapping[str, Any],
+        result: Any,
+        exc: Optional[Exception],
+    ) -> Any:
+        if exc is None:
+            self._print("✅ Result", result)
+            self._append_function_call_ok(function_name, arguments, result)
+            return result
+        self._print("🛑 Error", f"{exc}")
+        self._print_exception(exc)
+        self._append_function_call_error(function_name, arguments, exc)
         return None
 
+    def _handle_function_calls(
+        self,
+        actions: List[Tuple[str, Mapping[str, Any]]],
+        outcomes: List[Tuple[Any, Optional[Exception]]],
+    ) -> Any:
+        final_result = None
+        feedbacks = []
+        for (function_name, arguments), (result, exc) in zip(actions, outcomes):
+            if exc is None:
+                self._print("✅ Result", function_name, result)
+                feedbacks.append(self._get_function_call_ok_feedback(
+                    function_name, arguments, result
+                ))
+                if function_name == "finish_conversation":
+                    final_result = result
+                continue
+            self._print("🛑 Error", function_name, f"{exc}")
+            self._print_exception(exc)
+            feedbacks.append(self._get_function_call_error_feedback(
+                function_name, arguments, exc
+            ))
+        self._append_message({
+            "role": "user",
+            "content": json.dumps({
+                "type": "feedback_batch",
+                "feedbacks": feedbacks,
+            })
+        })
+        return final_result
+
     def _append_feedback_error(self, exc: Exception):
         self._append_message({
             "role": "user",
@@ -161,12 +1125,9 @@ class Agent():
     ):
         self._append_message({
             "role": "user",
-            "content": json.dumps({
-                "type": "feedback_error",
-                "function": function,
-                "arguments": arguments,
-                "error": self._extract_exception(exc),
-            })
+            "content": json.dumps(self._get_function_call_error_feedback(
+                function, arguments, exc
+            ))
         })
 
     def _append_function_call_ok(
@@ -174,17 +1135,39 @@ class Agent():
     ):
         self._append_message({
             "role": "user",
-            "content": json.dumps({
-                "type": "feedback_success",
-                "function": function_name,
-                "arguments": arguments,
-                "result": result,
-            })
+            "content": json.dumps(self._get_function_call_ok_feedback(
+                function_name, arguments, result
+            ))
         })
 
+    def _get_function_call_error_feedback(
+        self, function: str, arguments: List[str], exc: Exception
+    ) -> Mapping[str, Any]:
+        return {
+            "type": "feedback_error",
+            "function": function,
+            "arguments": arguments,
+            "error": self._extract_exception(exc),
+        }
+
+    def _get_function_call_ok_feedback(
+        self, function_name: str, arguments: List[str], result: Any
+    ) -> Mapping[str, Any]:
+        return {
+            "type": "feedback_success",
+            "function": function_name,
+            "arguments": arguments,
+            "result": result,
+        }
+
     def _append_message(self, message: Any):
+        if self._prompt_caching:
+            message = _canonicalize_message(message)
+        model = self._response_model if get_role(message) == "assistant" else None
         self._previous_messages.append(message)
-        self._messages.append(message)
+        self._history_models.append(model)
+        if self._session_store is not None:
+            self._session_store.append(self._session_id, message, model)
 
     def _extract_exception(self, exc: Exception) -> Any:
         exc_str = f"{exc}"
@@ -206,77 +1189,98 @@ class Agent():
                 "valid_functions": self._function_names,
                 "action_required": "Choose a valid function",
             })
-        missing_arguments = []
-        invalid_arguments = []
-        # ensure all required arguments is provided
-        for key, value in self._function_schemas[function_name]["arguments"].items():
-            if value["required"] and key not in kwargs:
-                missing_arguments.append(key)
-        # ensure all provided arguments are on the spec
-        for key in kwargs:
-            if key not in self._function_schemas[function_name]["arguments"]:
-                invalid_arguments.append(key)
-        # contruct error if any
-        if len(missing_arguments) > 0 or len(invalid_arguments) > 0:
-            error_details = {}
-            if len(missing_arguments) > 0:
-                error_details["missing_arguments"] = missing_arguments
-            if len(invalid_arguments) > 0:
-                error_details["invalid_arguments"] = invalid_arguments
+        # the compiled validator checks names, types and Literal values,
+        # and returns the coerced arguments
+        try:
+            return self._validators[function_name](kwargs)
+        except ArgumentError as exc:
             raise self._map_to_exception({
                 "error": "INVALID ARGUMENTS",
-                "details": error_details,
+                "details": exc.errors,
                 "correct_function_schema": self._function_schemas[function_name],
-                "action_required": "Revise your response to include all required arguments and remove any invalid ones",
+                "action_required": "Revise your response to include all required arguments with the correct types and remove any invalid ones",  # noqa
             })
 
     def _execute_function(
         self, function_name: str, kwargs: Mapping[str, Any]
     ) -> Any:
+        is_cached, result = self._get_cached_result(function_name, kwargs)
+        if is_cached:
+            return result
         try:
-            function_map = self._function_map
-            return function_map[function_name](**kwargs)
+            function = self._function_map[function_name]
+            result = self._get_tool_executor(function_name, function).run(
+                function_name, function, kwargs
+            )
+            if inspect.isawaitable(result):
+                result = asyncio.run(result)
         except Exception as exc:
-            raise self._map_to_exception({
-                "error": "EXECUTION FAILED",
+            raise self._map_execution_exception(function_name, exc)
+        self._set_cached_result(function_name, kwargs, result)
+        return result
+
+    async def _execute_function_async(
+        self, function_name: str, kwargs: Mapping[str, Any]
+    ) -> Any:
+        is_cached, result = self._get_cached_result(function_name, kwargs)
+        if is_cached:
+            return result
+        try:
+            function = self._function_map[function_name]
+            if inspect.iscoroutinefunction(function):
+                result = await function(**kwargs)
+            else:
+                result = await self._get_tool_executor(function_name, function).run_async(  # noqa
+                    function_name, function, kwargs
+                )
+            if inspect.isawaitable(result):
+                result = await result
+        except Exception as exc:
+            raise self._map_execution_exception(function_name, exc)
+        self._set_cached_result(function_name, kwargs, result)
+        return result
+
+    def _get_tool_executor(self, function_name: str, function: Callable) -> Any:
+        if function_name == "finish_conversation" or inspect.iscoroutinefunction(function):  # noqa
+            return self._inline_executor
+        return self._tool_executors.get(function_name, self._tool_executor)
+
+    def _is_cacheable(self, function_name: str) -> bool:
+        return (
+            self._tool_cache is not None and
+            function_name != "finish_conversation" and
+            self._tool_cache.is_cacheable(function_name)
+        )
+
+    def _get_cached_result(
+        self, function_name: str, kwargs: Mapping[str, Any]
+    ) -> Tuple[bool, Any]:
+        if not self._is_cacheable(function_name):
+            return False, None
+        return self._tool_cache.get(function_name, kwargs)
+
+    def _set_cached_result(self, function_name: str, kwargs: Mapping[str, Any], result: Any):  # noqa
+        if self._is_cacheable(function_name):
+            self._tool_cache.set(function_name, kwargs, result)
+
+    def _map_execution_exception(self, function_name: str, exc: Exception) -> Exception:  # noqa
+        if isinstance(exc, ToolTimeoutError):
+            return self._map_to_exception({
+                "error": "TOOL TIMEOUT",
                 "details": f"{exc}",
-                "correct_function_schema": self._function_schemas[function_name],
-                "action_required": "Revise your arguments",
+                "action_required": "Use simpler arguments, or choose another function",
             })
+        return self._map_to_exception({
+            "error": "EXECUTION FAILED",
+            "details": f"{exc}",
+            "correct_function_schema": self._function_schemas[function_name],
+            "action_required": "Revise your arguments",
+        })
 
     def _extract_agent_message(self, response_content) -> Mapping[str, Any]:
         try:
-            return json.loads(response_content)
+            return extract_json_object(response_content)
         except Exception:
-            json_pattern = re.compile(r'```(json)?\n({.*?})\n```', re.DOTALL)
-            # Search for the pattern in the content
-            match = json_pattern.search(response_content)
-            if match:
-                json_str = match.group(2)
-                # Parse the JSON string to ensure it is valid
-                return json.loads(json_str)
-            # The dumbest way
-            brace_stack = []
-            json_start = -1
-            json_end = -1
-            for i, char in enumerate(response_content):
-                if char == '{':
-                    if not brace_stack:
-                        json_start = i
-                    brace_stack.append('{')
-                elif char == '}':
-                    if brace_stack:
-                        brace_stack.pop()
-                        if not brace_stack:
-                            json_end = i + 1
-                            break
-            if json_start != -1 and json_end != -1:
-                json_str = response_content[json_start:json_end]
-                # Parse the JSON string to ensure it is valid
-                try:
-                    return json.loads(json_str)
-                except Exception:
-                    pass
             raise self._map_to_exception({
                 "error": "MALFORMED PAYLOAD",
                 "error_message": "Your response does not match the required JSON format",
@@ -290,19 +1294,21 @@ class Agent():
             error_details.append("The `thought` field is missing")
         if "thought" in json_message and not isinstance(json_message["thought"], str):
             error_details.append("The `thought` field is not a string")
-        if "action" not in json_message:
-            error_details.append("The `action` field is missing")
-        if "action" in json_message and not isinstance(json_message["action"], dict):
-            error_details.append("The `action` field is not an object")
-        if "action" in json_message and isinstance(json_message["action"], dict):
-            if "function" not in json_message["action"]:
-                error_details.append("The `function` field is missing from the `action` object")  # noqa
-            if "function" in json_message["action"] and not isinstance(json_message["action"]["function"], str):  # noqa
-                error_details.append("The action's `function` field is not a string")
-            if "arguments" not in json_message["action"]:
-                error_details.append("The `arguments` field is missing from the `action` object")  # noqa
-            if "arguments" in json_message["action"] and not isinstance(json_message["action"]["arguments"], dict):  # noqa
-                error_details.append("The action's `arguments` field is not an object")
+        if self._parallel_actions and "actions" in json_message:
+            if not isinstance(json_message["actions"], list) or len(json_message["actions"]) == 0:  # noqa
+                error_details.append("The `actions` field is not a non-empty list")
+            else:
+                for index, action in enumerate(json_message["actions"]):
+                    error_details += self._get_action_error_details(
+                        action, f"`actions[{index}]`"
+                    )
+        elif "action" not in json_message:
+            field_name = "actions" if self._parallel_actions else "action"
+            error_details.append(f"The `{field_name}` field is missing")
+        else:
+            error_details += self._get_action_error_details(
+                json_message["action"], "`action`"
+            )
         if len(error_details) > 0:
             raise self._map_to_exception({
                 "error": "MALFORMED PAYLOAD",
@@ -311,3 +1317,68 @@ class Agent():
                 "required_format": self._response_format,
                 "action_required": "Reformat your entire response to match the required_format",
             })
+
+    def _get_action_error_details(self, action: Any, field_name: str) -> List[str]:
+        if not isinstance(action, dict):
+            return [f"The {field_name} field is not an object"]
+        error_details = []
+        if "function" not in action:
+            error_details.append(f"The `function` field is missing from the {field_name} object")  # noqa
+        if "function" in action and not isinstance(action["function"], str):
+            error_details.append(f"The {field_name}'s `function` field is not a string")
+        if "arguments" not in action:
+            error_details.append(f"The `arguments` field is missing from the {field_name} object")  # noqa
+        if "arguments" in action and not isinstance(action["arguments"], dict):
+            error_details.append(f"The {field_name}'s `arguments` field is not an object")
+        return error_details
+
+
+def _get_field(message: Any, name: str) -> Any:
+    if isinstance(message, dict):
+        return message.get(name)
+    return getattr(message, name, None)
+
+
+def _get_final_answer(feedback_message: Any) -> Optional[Tuple[Any]]:
+    # `(final_answer,)` if the feedback reports a successful finish_conversation
+    try:
+        feedback = json.loads(get_content(feedback_message))
+    except Exception:
+        return None
+    if not isinstance(feedback, dict):
+        return None
+    feedbacks = feedback.get("feedbacks", []) if feedback.get("type") == "feedback_batch" else [feedback]  # noqa
+    for item in feedbacks:
+        if item.get("type") == "feedback_success" and item.get("function") == "finish_conversation":  # noqa
+            return (item.get("result"),)
+    return None
+
+
+def _canonicalize_message(message: Any) -> Mapping[str, Any]:
+    # Same message, same bytes: only the fields sent to the LLM, in a fixed order
+    canonical = {"role": get_role(message), "content": get_content(message)}
+    tool_calls = _get_field(message, "tool_calls")
+    if tool_calls:
+        canonical["tool_calls"] = [to_dict(tool_call) for tool_call in tool_calls]
+    for name in ("tool_call_id", "name"):
+        if _get_field(message, name):
+            canonical[name] = _get_field(message, name)
+    return canonical
+
+
+def _with_cache_control(message: Any) -> Mapping[str, Any]:
+    content = get_content(message)
+    if not isinstance(content, str):
+        return message
+    return {
+        **_canonicalize_message(message),
+        "content": [{
+            "type": "text", "text": content, "cache_control": {"type": "ephemeral"}
+        }],
+    }
+
+
+def _import_litellm() -> Any:
+    # litellm takes about a second to import, load it on first use
+    import litellm
+    return litellm
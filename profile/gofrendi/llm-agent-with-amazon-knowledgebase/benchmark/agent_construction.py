@@ -0,0 +1,64 @@
+"""
+Micro-benchmark for Agent construction.
+
+Run from the `llm-agent-with-amazon-knowledgebase` directory:
+
+    python -m benchmark.agent_construction
+"""
+import timeit
+from typing import Annotated, Dict, List, Literal
+
+from agent import Agent, clear_caches
+
+
+def search_google(query: str, num_results: int = 10) -> str:
+    """Search factual information from the internet."""
+    return "[]"
+
+
+def search_amazon_revenue(query: str) -> str:
+    """Search anything related to amazon revenue"""
+    return "{}"
+
+
+def get_current_weather(
+    latitude: float,
+    longitude: float,
+    temperature_unit: Literal["celsius", "fahrenheit"],
+) -> str:
+    """Get the current weather in a given location."""
+    return "{}"
+
+
+def summarize(
+    numbers: Annotated[List[float], "Numbers to summarize"],
+    labels: Dict[str, List[str]],
+) -> Dict[str, float]:
+    """Summarize a list of numbers."""
+    return {}
+
+
+TOOLS = [search_google, search_amazon_revenue, get_current_weather, summarize]
+
+
+def create_agent():
+    return Agent(model="gpt-4o", tools=TOOLS)
+
+
+def create_agent_cold():
+    clear_caches()
+    return create_agent()
+
+
+def measure(fn, number: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number
+
+
+if __name__ == "__main__":
+    number = 2000
+    cold = measure(create_agent_cold, number)
+    warm = measure(create_agent, number)
+    print(f"{'scenario':<10} {'per agent (us)':>15}")
+    print(f"{'cold':<10} {cold * 1e6:>15.2f}")
+    print(f"{'warm':<10} {warm * 1e6:>15.2f}")
+    print(f"speedup: {cold / warm:.1f}x")
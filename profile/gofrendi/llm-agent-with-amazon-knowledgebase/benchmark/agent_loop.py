@@ -0,0 +1,145 @@
+"""
+Offline benchmark of the agent loop's own overhead.
+
+Every completion is served by `fake_llm.FakeLLM` and every tool is a local
+function, so nothing here touches the network. Measured:
+
+- construction: time to create an `Agent`
+- iteration: agent overhead per iteration (completion latency is zero)
+- parse_validate: response parsing + action validation throughput
+- sessions: wall time and memory (retained by finished conversations) per
+  conversation for 1/100/10k concurrent conversations (`add_user_message_async`)
+
+Results are printed (or written with `--output`) as JSON, so they can be
+compared between commits.
+
+Run from the `llm-agent-with-amazon-knowledgebase` directory:
+
+    python -m benchmark.agent_loop [--sessions 1 100 10000] [--output result.json]
+"""
+import argparse
+import asyncio
+import gc
+import json
+import platform
+import sys
+import time
+import timeit
+import tracemalloc
+from typing import Any, List, Mapping
+
+from agent import Agent
+from benchmark.agent_construction import TOOLS
+from fake_llm import FakeLLM, scripted_responder
+
+ACTIONS = [
+    {"function": "search_google", "arguments": {"query": "amazon revenue 2023"}},
+    {"function": "search_amazon_revenue", "arguments": {"query": "revenue 2023"}},
+    {
+        "function": "get_current_weather",
+        "arguments": {
+            "latitude": "47.6", "longitude": -122.3, "temperature_unit": "Celsius"
+        },
+    },
+]
+QUESTION = "What is Amazon revenue in 2023 and how is the weather in Seattle?"
+
+
+def create_agent(backend: FakeLLM) -> Agent:
+    return Agent(model="fake", tools=TOOLS, backend=backend, verbose=False)
+
+
+def measure(fn, number: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number
+
+
+def measure_construction(number: int) -> Mapping[str, Any]:
+    backend = FakeLLM()
+    duration = measure(lambda: create_agent(backend), number)
+    return {"per_agent_us": duration * 1e6}
+
+
+def measure_iteration(number: int) -> Mapping[str, Any]:
+    backend = FakeLLM(scripted_responder(ACTIONS))
+    iterations = len(ACTIONS) + 1
+
+    def run_conversation():
+        create_agent(backend).add_user_message(QUESTION)
+    duration = measure(run_conversation, number)
+    return {
+        "iterations_per_conversation": iterations,
+        "per_conversation_us": duration * 1e6,
+        "per_iteration_us": duration / iterations * 1e6,
+    }
+
+
+def measure_parse_validate(number: int) -> Mapping[str, Any]:
+    agent = create_agent(FakeLLM())
+    response_message = FakeLLM(scripted_responder(ACTIONS[2:])).completion(
+        model="fake", messages=[]
+    ).choices[0].message
+
+    def parse_validate():
+        response_map = agent._extract_agent_message(response_message.content)
+        agent._validate_agent_message(response_map)
+        for function_name, function_kwargs in agent._get_actions(response_map):
+            agent._validate_function_call(function_name, function_kwargs)
+    duration = measure(parse_validate, number)
+    return {"per_response_us": duration * 1e6, "responses_per_second": 1 / duration}
+
+
+def measure_sessions(session_count: int) -> Mapping[str, Any]:
+    backend = FakeLLM(scripted_responder(ACTIONS))
+
+    async def run_sessions():
+        agents = [create_agent(backend) for _ in range(session_count)]
+        results = await asyncio.gather(*[
+            agent.add_user_message_async(QUESTION) for agent in agents
+        ])
+        return agents, results
+
+    gc.collect()
+    start = time.perf_counter()
+    _, results = asyncio.run(run_sessions())
+    duration = time.perf_counter() - start
+    finished = len([result for result in results if result == "done"])
+    # Memory is traced in a separate run, tracemalloc slows everything down
+    gc.collect()
+    tracemalloc.start()
+    agents, _ = asyncio.run(run_sessions())
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del agents
+    return {
+        "sessions": session_count,
+        "finished": finished,
+        "duration_s": duration,
+        "per_session_ms": duration / session_count * 1000,
+        "bytes_per_session": current / session_count,
+        "peak_bytes_per_session": peak / session_count,
+    }
+
+
+def run(session_counts: List[int], number: int) -> Mapping[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "construction": measure_construction(number),
+        "iteration": measure_iteration(number // 10),
+        "parse_validate": measure_parse_validate(number),
+        "sessions": [measure_sessions(count) for count in session_counts],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 100, 10000])
+    parser.add_argument("--number", type=int, default=1000)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+    result = run(args.sessions, args.number)
+    if args.output is None:
+        json.dump(result, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
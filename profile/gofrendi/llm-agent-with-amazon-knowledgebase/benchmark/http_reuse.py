@@ -0,0 +1,62 @@
+"""
+Verify that the shared HTTP session reuses connections.
+
+A local stub server counts TCP connections while the same number of requests is
+sent with bare `requests.get` and with `http_client.http_get`.
+
+Run from the `llm-agent-with-amazon-knowledgebase` directory:
+
+    python -m benchmark.http_reuse
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from http_client import http_get
+
+connection_count = 0
+connection_lock = threading.Lock()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        # One handler instance is created for every TCP connection
+        global connection_count
+        with connection_lock:
+            connection_count += 1
+        super().setup()
+
+    def do_GET(self):
+        body = b'{"lat": -6.177, "lon": 106.6284}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def measure(get, url: str, number: int):
+    global connection_count
+    connection_count = 0
+    start = time.perf_counter()
+    for _ in range(number):
+        get(url).json()
+    return connection_count, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/json"
+    number = 200
+    print(f"{'client':<16} {'requests':>8} {'connections':>11} {'total (ms)':>10}")
+    for name, get in [("requests.get", requests.get), ("http_get", http_get)]:
+        connections, duration = measure(get, url, number)
+        print(f"{name:<16} {number:>8} {connections:>11} {duration * 1000:>10.1f}")
+    server.shutdown()
@@ -0,0 +1,121 @@
+"""
+Import time budget of the agent modules.
+
+Every module is imported in a fresh interpreter (`python -X importtime`), the
+best of `--repeat` runs is reported like `python -m benchmark_imports`:
+cumulative seconds, category (root, project, dependency or transitive) and
+module, slowest first. The check fails (exit code 1) when a module takes more
+than `--threshold` milliseconds to import, or when importing it loads a heavy
+dependency that should only be loaded on first use (`LAZY_DEPENDENCIES`).
+
+Run from the `llm-agent-with-amazon-knowledgebase` directory:
+
+    python -m benchmark.import_time [agent main ...] [--threshold 300] [--top 15]
+"""
+import argparse
+import os
+import subprocess
+import sys
+from typing import List, Optional, Tuple
+
+MODULES = ["agent", "evaluate", "server", "main"]
+LAZY_DEPENDENCIES = ["litellm", "boto3", "botocore", "requests", "bs4", "lxml", "numpy"]  # noqa
+
+
+class ImportRecord():
+    def __init__(self, name: str, cumulative: float, parent: Optional[str]):
+        self.name = name
+        self.cumulative = cumulative
+        self.parent = parent
+
+
+def run_import(module: str) -> Tuple[List[ImportRecord], List[str]]:
+    """Import `module` in a new interpreter, return its imports and `sys.modules`."""  # noqa
+    process = subprocess.run(
+        [
+            sys.executable, "-X", "importtime", "-c",
+            f"import {module}, sys; print(' '.join(sys.modules))",
+        ],
+        capture_output=True, text=True, check=True
+    )
+    return parse_importtime(process.stderr), process.stdout.split()
+
+
+def parse_importtime(output: str) -> List[ImportRecord]:
+    """
+    Parse `-X importtime` lines (`self | cumulative | name`, indented by depth,
+    children listed before their parent).
+    """
+    records = []
+    pending = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, raw_name = line.split("|")
+        name = raw_name.strip()
+        depth = (len(raw_name) - len(raw_name.lstrip()) - 1) // 2
+        record = ImportRecord(name, int(cumulative) / 1e6, None)
+        for child in pending.pop(depth + 1, []):
+            child.parent = name
+        pending.setdefault(depth, []).append(record)
+        records.append(record)
+    return records
+
+
+def get_category(record: ImportRecord, root: str) -> str:
+    if record.name == root:
+        return "root"
+    if is_project_module(record.name):
+        return "project"
+    if record.parent is not None and (record.parent == root or is_project_module(record.parent)):  # noqa
+        return "dependency"
+    return "transitive"
+
+
+def is_project_module(name: str) -> bool:
+    return os.path.exists(f"{name.split('.')[0]}.py")
+
+
+def get_descendants(records: List[ImportRecord], root: str) -> List[ImportRecord]:
+    parents = {record.name: record.parent for record in records}
+
+    def is_descendant(name: Optional[str]) -> bool:
+        while name is not None:
+            if name == root:
+                return True
+            name = parents.get(name)
+        return False
+    return [record for record in records if is_descendant(record.name)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    parser.add_argument("--threshold", type=float, default=300, help="milliseconds")  # noqa
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+    failures = []
+    for module in args.modules:
+        runs = [run_import(module) for _ in range(args.repeat)]
+        records, modules = min(runs, key=lambda run: [
+            record.cumulative for record in run[0] if record.name == module
+        ][0])
+        records = get_descendants(records, module)
+        print()
+        for record in sorted(records, key=lambda record: -record.cumulative)[:args.top]:  # noqa
+            category = get_category(record, module)
+            source = f"from {record.parent}" if category == "transitive" else ""  # noqa
+            print(f"{record.cumulative:.4f} {category:<10} {record.name:<42} {source}".rstrip())  # noqa
+        duration = [record.cumulative for record in records if record.name == module][0]  # noqa
+        if duration * 1e3 > args.threshold:
+            failures.append(f"{module}: {duration * 1e3:.0f} ms > {args.threshold:.0f} ms")  # noqa
+        eager = [name for name in LAZY_DEPENDENCIES if name in modules]
+        if len(eager) > 0:
+            failures.append(f"{module}: imports {', '.join(eager)} eagerly")
+    print()
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if len(failures) > 0:
+        sys.exit(1)
+    print(f"OK, every module imports in less than {args.threshold:.0f} ms")
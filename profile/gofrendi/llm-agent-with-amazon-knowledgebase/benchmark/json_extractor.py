@@ -0,0 +1,150 @@
+"""
+Fuzz and benchmark `extract_json_object` against the previous extractor.
+
+The corpus is every LLM response recorded in `../llm-agent-experiment/log.txt`.
+Each response is also mutated (truncated, wrapped in prose or code fences,
+followed by another object, ...) to simulate what LLMs produce.
+
+Run from the `llm-agent-with-amazon-knowledgebase` directory:
+
+    python -m benchmark.json_extractor
+"""
+import ast
+import json
+import os
+import random
+import re
+import timeit
+
+from json_extractor import extract_json_object
+
+LOG_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "llm-agent-experiment",
+    "log.txt",
+)
+
+# Cut inside an action, these must never be extracted
+TRUNCATED_ACTIONS = [
+    '{"thought": "clean up", "action": {"function": "run_shell_command", "arguments": {"command": "rm -rf /tmp/build/ca',  # noqa
+    '{"thought": "x", "action": {"function": "calculate", "arguments": {"formula": "1000000 * 12',  # noqa
+    '{"thought": "x", "actions": [{"function": "calculate", "arguments": {"formula": "1"}}, {"function": "calc',  # noqa
+]
+
+
+def load_corpus(path: str = LOG_PATH):
+    responses = []
+    with open(path) as f:
+        for line in f:
+            if not line.startswith("🤖 Response Message(content="):
+                continue
+            literal = line[len("🤖 Response Message(content="):line.rindex(", role=")]
+            responses.append(ast.literal_eval(literal))
+    return responses
+
+
+def legacy_extract(response_content):
+    """The extractor used before `extract_json_object`."""
+    try:
+        return json.loads(response_content)
+    except Exception:
+        json_pattern = re.compile(r'```(json)?\n({.*?})\n```', re.DOTALL)
+        match = json_pattern.search(response_content)
+        if match:
+            return json.loads(match.group(2))
+        brace_stack = []
+        json_start = -1
+        json_end = -1
+        for i, char in enumerate(response_content):
+            if char == '{':
+                if not brace_stack:
+                    json_start = i
+                brace_stack.append('{')
+            elif char == '}':
+                if brace_stack:
+                    brace_stack.pop()
+                    if not brace_stack:
+                        json_end = i + 1
+                        break
+        if json_start != -1 and json_end != -1:
+            return json.loads(response_content[json_start:json_end])
+        raise ValueError("No JSON object found")
+
+
+def mutate(response: str, rng: random.Random):
+    """Yield `(mutation_name, text)` pairs."""
+    yield "original", response
+    yield "prose", f"Here is my response:\n{response}\nI hope it helps."
+    yield "fence", f"```json\n{response.strip()}\n```"
+    yield "unclosed_fence", f"```json\n{response.strip()}"
+    yield "brace_in_prose", f"Using {{curly}} braces:\n{response}"
+    yield "two_objects", f'{response}\n\n{{"type": "feedback_success", "result": "x"}}'
+    yield "feedback_first", f'{{"type": "feedback_success", "result": "x"}}\n{response}'
+    yield "truncated", response[:rng.randint(len(response) // 2, len(response) - 1)]
+    yield "random_cut", response[:rng.randint(0, len(response))]
+    arguments = response.find('"arguments"')
+    if arguments != -1:
+        # Cut inside the action, e.g. in the middle of a shell command
+        yield "cut_in_arguments", response[:rng.randint(arguments, len(response.rstrip()) - 2)]  # noqa
+
+
+def get_actions(data):
+    return {key: data[key] for key in ("action", "actions") if key in data}
+
+
+def is_agent_message(data):
+    return isinstance(data, dict) and "thought" in data
+
+
+def run(extract, samples):
+    ok = 0
+    for _, text in samples:
+        try:
+            if is_agent_message(extract(text)):
+                ok += 1
+        except (ValueError, TypeError, AttributeError):
+            pass
+    return ok
+
+
+if __name__ == "__main__":
+    rng = random.Random(42)
+    corpus = load_corpus()
+    samples = [
+        sample for response in corpus for sample in mutate(response, rng)
+    ]
+    # Fuzz: the new extractor only ever raises ValueError, and never returns
+    # an action that differs from the complete response (made up by repair)
+    unsafe = []
+    for response in corpus:
+        try:
+            expected = get_actions(json.loads(response))
+        except ValueError:
+            expected = None
+        for name, text in mutate(response, random.Random(42)):
+            try:
+                actions = get_actions(extract_json_object(text))
+            except ValueError:
+                continue
+            if expected is not None and len(actions) > 0 and actions != expected:  # noqa
+                unsafe.append((name, text))
+    for text in TRUNCATED_ACTIONS:
+        try:
+            unsafe.append(("truncated_action", extract_json_object(text)))
+        except ValueError:
+            pass
+    assert len(unsafe) == 0, f"repaired actions returned: {unsafe[:3]}"
+    print(f"corpus: {len(corpus)} responses, {len(samples)} samples")
+    print(f"{'mutation':<16} {'legacy':>7} {'new':>7}")
+    for mutation in dict.fromkeys([name for name, _ in samples]):
+        subset = [sample for sample in samples if sample[0] == mutation]
+        print(
+            f"{mutation:<16} {run(legacy_extract, subset):>7} "
+            f"{run(extract_json_object, subset):>7}  / {len(subset)}"
+        )
+    number = 20
+    for name, extract in [("legacy", legacy_extract), ("new", extract_json_object)]:
+        duration = min(timeit.repeat(
+            lambda: run(extract, samples), number=number, repeat=3
+        )) / number
+        print(f"{name:<8} {duration / len(samples) * 1e6:>8.2f} us per sample")
@@ -0,0 +1,102 @@
+"""
+Benchmark `local_retrieval.LocalVectorIndex` on a synthetic corpus.
+
+Documents are random words about one of 100 topics (a topic vocabulary and
+Zipf-distributed common words), queries are words taken from random chunks.
+For every corpus size: build time, index size on disk, query latency
+(p50/p95) of exact search and of the IVF index, and the IVF recall@k against
+exact search.
+
+Run from the `llm-agent-with-amazon-knowledgebase` directory:
+
+    python -m benchmark.local_retrieval [--chunks 1000 10000 100000]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from typing import List
+
+import numpy as np
+
+from local_retrieval import LocalVectorIndex
+
+
+def create_documents(rng: random.Random, chunk_count: int, chunk_size: int) -> List[str]:  # noqa
+    """One document per 20 chunks, each about one of 100 topics."""
+    common_words = [f"w{index}" for index in range(200)]
+    documents = []
+    for _ in range(max(1, chunk_count // 20)):
+        topic = rng.randrange(100)
+        topic_words = [f"t{topic}x{index}" for index in range(40)]
+        words = rng.choices(
+            common_words + topic_words,
+            weights=[1 / (rank + 1) for rank in range(len(common_words))] + [0.2] * len(topic_words),  # noqa
+            k=20 * chunk_size // 6,
+        )
+        documents.append(" ".join(words))
+    return documents
+
+
+def measure_queries(index: LocalVectorIndex, queries: List[str], top_k: int, **kwargs):  # noqa
+    durations, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(index.search(query, top_k=top_k, **kwargs))
+        durations.append(time.perf_counter() - start)
+    durations = np.array(durations) * 1e3
+    return np.percentile(durations, 50), np.percentile(durations, 95), results
+
+
+def get_size(directory: str) -> float:
+    return sum([
+        os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)  # noqa
+    ]) / 1024 / 1024
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, nargs="+", default=[1000, 10000, 100000])  # noqa
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--probes", type=int, default=8)
+    args = parser.parse_args()
+    rng = random.Random(0)
+    print(f"{'chunks':>8} {'index':>8} {'build s':>8} {'MiB':>7} {'p50 ms':>8} {'p95 ms':>8} {'recall':>7}")  # noqa
+    for chunk_count in args.chunks:
+        documents = [
+            (f"doc{index}.txt", text)
+            for index, text in enumerate(create_documents(rng, chunk_count, 800))
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            exact = LocalVectorIndex(os.path.join(directory, "exact"))
+            start = time.perf_counter()
+            count = exact.build(documents)
+            exact_build = time.perf_counter() - start
+            ivf = LocalVectorIndex(os.path.join(directory, "ivf"))
+            lists = max(1, int(count ** 0.5))
+            start = time.perf_counter()
+            ivf.build(documents, lists=lists)
+            ivf_build = time.perf_counter() - start
+            chunk_texts = [chunk["text"] for chunk in exact.search("w1", top_k=count)]  # noqa
+            queries = [
+                " ".join(rng.sample(rng.choice(chunk_texts).split(), 5))
+                for _ in range(args.queries)
+            ]
+            p50, p95, expected = measure_queries(exact, queries, args.top_k)
+            print(
+                f"{count:>8} {'exact':>8} {exact_build:>8.2f} "
+                f"{get_size(os.path.join(directory, 'exact')):>7.1f} "
+                f"{p50:>8.2f} {p95:>8.2f} {1:>7.3f}"
+            )
+            p50, p95, results = measure_queries(ivf, queries, args.top_k, probes=args.probes)  # noqa
+            recall = np.mean([
+                len(set([r["text"] for r in result]) & set([r["text"] for r in reference])) / max(1, len(reference))  # noqa
+                for result, reference in zip(results, expected)
+            ])
+            print(
+                f"{count:>8} {f'ivf{lists}':>8} {ivf_build:>8.2f} "
+                f"{get_size(os.path.join(directory, 'ivf')):>7.1f} "
+                f"{p50:>8.2f} {p95:>8.2f} {recall:>7.3f}"
+            )
@@ -0,0 +1,28 @@
+"""
+Input tokens of the system message for every `schema_format`.
+
+Run from the `llm-agent-with-amazon-knowledgebase` directory:
+
+    python -m benchmark.prompt_tokens [model]
+"""
+import sys
+
+import litellm
+from agent import Agent
+from benchmark.agent_construction import TOOLS
+
+SCHEMA_FORMATS = ["json", "minified", "signature"]
+
+
+if __name__ == "__main__":
+    model = sys.argv[1] if len(sys.argv) > 1 else "gpt-4o"
+    baseline = None
+    print(f"{'schema_format':<14} {'characters':>10} {'tokens':>8} {'saving':>8}")
+    for schema_format in SCHEMA_FORMATS:
+        agent = Agent(model=model, tools=TOOLS, schema_format=schema_format)
+        content = agent.get_system_messages()["content"]
+        tokens = litellm.token_counter(model=model, text=content)
+        if baseline is None:
+            baseline = tokens
+        saving = 1 - tokens / baseline
+        print(f"{schema_format:<14} {len(content):>10} {tokens:>8} {saving:>8.1%}")
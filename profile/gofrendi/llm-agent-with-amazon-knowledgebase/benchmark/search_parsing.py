@@ -0,0 +1,67 @@
+"""
+Benchmark `google_search.parse_search_results` (lxml) against the original
+full-page parse (`BeautifulSoup(html, 'html.parser')` + `find_all`), which is
+also the fallback without lxml.
+
+For every HTML fixture (`benchmark/fixtures/*.html` by default, or the pages
+given as arguments, e.g. saved result pages) both must return the same
+`title`/`link`/`snippet` records. Timings are per page, plus a cached
+`search_google` call.
+
+Run from the `llm-agent-with-amazon-knowledgebase` directory:
+
+    python -m benchmark.search_parsing [page.html ...]
+"""
+import glob
+import os
+import sys
+import timeit
+from unittest import mock
+
+import google_search
+from google_search import parse_search_results, parse_search_results_full
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+class FakeResponse():
+    def __init__(self, text: str):
+        self.status_code = 200
+        self.text = text
+
+
+def measure(fn, number: int = 20) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=3)) / number
+
+
+def has_lxml() -> bool:
+    try:
+        import lxml  # noqa
+    except ImportError:
+        print("lxml is not installed, skipping it")
+        return False
+    return True
+
+
+if __name__ == "__main__":
+    paths = sys.argv[1:] or sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.html")))
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            html = f.read()
+        expected = parse_search_results_full(html)
+        print(f"{os.path.basename(path)}: {len(html) / 1024:.0f} KiB, {len(expected)} results")  # noqa
+        full_time = measure(lambda: parse_search_results_full(html))
+        print(f"  {'full tree, html.parser':<28} {full_time * 1e3:>8.2f} ms")
+        if has_lxml():
+            results = parse_search_results(html, parser="lxml")
+            assert results == expected, f"lxml results differ on {path}"
+            duration = measure(lambda: parse_search_results(html, parser="lxml"))
+            print(
+                f"  {'selective, lxml':<28} {duration * 1e3:>8.2f} ms "
+                f"({full_time / duration:.1f}x)"
+            )
+        google_search.clear_search_cache()
+        with mock.patch.object(google_search, "http_get", return_value=FakeResponse(html)):  # noqa
+            google_search.search_google("amazon revenue")
+            cached_time = measure(lambda: google_search.search_google("amazon revenue"), 1000)  # noqa
+        print(f"  {'cached search_google':<28} {cached_time * 1e3:>8.3f} ms")
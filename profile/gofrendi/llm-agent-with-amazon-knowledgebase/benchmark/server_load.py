@@ -0,0 +1,150 @@
+"""
+Offline load test of `server.AgentServer`.
+
+The server runs in-process on a free port, every agent uses `fake_llm.FakeLLM`
+(with `--latency` seconds per completion) and local tools, and clients send
+`POST /ask` over keep-alive connections. For every concurrency level the test
+reports throughput, client latency (p50/p95/p99) and how many questions were
+rejected (503/429) or timed out (504), which shows where the server stops
+scaling for a given `--workers` / `--queue`.
+
+Run from the `llm-agent-with-amazon-knowledgebase` directory:
+
+    python -m benchmark.server_load [--concurrency 1 16 64 256] [--requests 500]
+
+Use `--serve` to only start the fake server (e.g., for an external load tool).
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, List, Mapping, Optional, Tuple
+
+from agent import Agent
+from benchmark.agent_construction import TOOLS
+from benchmark.agent_loop import ACTIONS, QUESTION
+from fake_llm import FakeLLM, scripted_responder
+from server import AgentServer
+
+
+def create_server(args: argparse.Namespace) -> AgentServer:
+    backend = FakeLLM(scripted_responder(ACTIONS), latency=args.latency)
+    return AgentServer(
+        lambda session_key: Agent(model="fake", tools=TOOLS, backend=backend, verbose=False),  # noqa
+        max_workers=args.workers,
+        max_queue=args.queue,
+        request_timeout=args.timeout,
+    )
+
+
+async def post(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter, data: Any
+) -> Tuple[int, Any]:
+    body = json.dumps(data).encode()
+    writer.write(
+        b"POST /ask HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"  # noqa
+        + f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split(b" ")[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        key, value = line.decode().split(":", 1)
+        headers[key.strip().lower()] = value.strip()
+    payload = await reader.readexactly(int(headers["content-length"]))
+    return status, json.loads(payload)
+
+
+async def run_client(port: int, request_count: int, results: List[Tuple[int, float]]):  # noqa
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        for _ in range(request_count):
+            start = time.perf_counter()
+            status, _ = await post(reader, writer, {"question": QUESTION})
+            results.append((status, time.perf_counter() - start))
+    finally:
+        writer.close()
+
+
+def percentile(values: List[float], ratio: float) -> Optional[float]:
+    if len(values) == 0:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(ratio * len(values)))]
+
+
+async def run_level(port: int, concurrency: int, request_count: int) -> Mapping[str, Any]:  # noqa
+    results = []
+    per_client = max(1, request_count // concurrency)
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        run_client(port, per_client, results) for _ in range(concurrency)
+    ])
+    duration = time.perf_counter() - start
+    latencies = [latency for status, latency in results if status == 200]
+    statuses = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+
+    def ms(value: Optional[float]) -> Optional[float]:
+        return round(value * 1e3, 1) if value is not None else None
+    return {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "answers_per_second": round(len(latencies) / duration, 1),
+        "p50_ms": ms(percentile(latencies, 0.5)),
+        "p95_ms": ms(percentile(latencies, 0.95)),
+        "p99_ms": ms(percentile(latencies, 0.99)),
+        "statuses": statuses,
+    }
+
+
+async def main(args: argparse.Namespace):
+    server = create_server(args)
+    port_future = asyncio.get_running_loop().create_future()
+    serve_task = asyncio.create_task(
+        server.serve(port=args.port, ready=port_future.set_result)
+    )
+    port = await port_future
+    if args.serve:
+        print(f"serving on http://127.0.0.1:{port}")
+        await serve_task
+        return
+    print(
+        f"workers={args.workers} queue={args.queue} latency={args.latency}s "
+        f"iterations={len(ACTIONS) + 1}"
+    )
+    print(f"{'clients':>8} {'answers/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  statuses")  # noqa
+    for concurrency in args.concurrency:
+        level = await run_level(port, concurrency, args.requests)
+        print(
+            f"{level['concurrency']:>8} {level['answers_per_second']:>10} "
+            f"{level['p50_ms']!s:>9} {level['p95_ms']!s:>9} {level['p99_ms']!s:>9}  "  # noqa
+            f"{level['statuses']}"
+        )
+    # Drain: questions still running finish before the server stops
+    drain_clients = [asyncio.create_task(run_client(port, 1, [])) for _ in range(args.workers)]  # noqa
+    await asyncio.sleep(args.latency)
+    serve_task.cancel()
+    await asyncio.gather(*drain_clients, return_exceptions=True)
+    try:
+        await serve_task
+    except asyncio.CancelledError:
+        pass
+    print(f"after shutdown: {server.get_stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64, 256])  # noqa
+    parser.add_argument("--requests", type=int, default=512)
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--queue", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--serve", action="store_true")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,81 @@
+"""
+Check that `JSONLSessionStore` sessions resume after a crash and benchmark it.
+
+A conversation is stored, the process "crashes" while writing its last line
+(the file is cut in the middle of it), a new agent resumes it and gets a new
+question, and a third agent resumes the session: every stored line must
+decode and the final answers must be returned. Timings: `load` and reading
+the last messages of a long session (decoded lazily).
+
+Run from the `llm-agent-with-amazon-knowledgebase` directory:
+
+    python -m benchmark.session_resume [--messages 10000]
+"""
+import argparse
+import os
+import tempfile
+import timeit
+
+from agent import Agent
+from fake_llm import FakeLLM, scripted_responder
+from session_store import JSONLSessionStore
+
+ACTIONS = [
+    {"function": "add", "arguments": {"a": 1, "b": 2}},
+    {"function": "add", "arguments": {"a": 3, "b": 4}},
+]
+
+
+def add(a: int, b: int) -> int:
+    """Add two numbers."""
+    return a + b
+
+
+def create_agent(store: JSONLSessionStore) -> Agent:
+    return Agent(
+        model="fake",
+        tools=[add],
+        backend=FakeLLM(scripted_responder(ACTIONS, final_answer="7")),
+        session_store=store,
+        session_id="crash",
+        verbose=False,
+    )
+
+
+def crash(path: str):
+    """Cut the last line in the middle, like a crash while writing it."""
+    with open(path, "rb+") as f:
+        content = f.read()
+        f.truncate(content.rstrip(b"\n").rfind(b"\n") + 20)
+
+
+def check_crash_resume(directory: str):
+    store = JSONLSessionStore(directory)
+    path = os.path.join(directory, "crash.jsonl")
+    assert create_agent(store).add_user_message("What is 1 + 2 + 4?") == "7"
+    crash(path)
+    agent = create_agent(store)
+    assert agent.resume() == "7"
+    assert agent.add_user_message("And again?") == "7"
+    agent = create_agent(store)
+    history = agent.get_history()
+    assert all([message is not None for message in history])
+    assert agent.resume() == "7"
+    print(f"crash, append and resume: OK ({len(history)} messages)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=10000)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        check_crash_resume(directory)
+        store = JSONLSessionStore(directory)
+        for index in range(args.messages):
+            store.append("long", {"role": "user", "content": f"message {index} " * 20})  # noqa
+        load_time = min(timeit.repeat(lambda: store.load("long"), number=10, repeat=3)) / 10  # noqa
+        tail_time = min(timeit.repeat(
+            lambda: store.load("long")[0][-20:], number=10, repeat=3
+        )) / 10
+        print(f"{'load':<28} {load_time * 1e3:>8.2f} ms ({args.messages} messages)")  # noqa
+        print(f"{'load + last 20 messages':<28} {tail_time * 1e3:>8.2f} ms")
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import tempfile
+from typing import Any, Callable, List, Literal, Mapping, Optional
+
+from helper import LRUCache, to_dict
+
+
+class CompletionCacheMiss(KeyError):
+    """Raised in `replay` mode when a completion has never been recorded."""
+
+
+class CachedResponse():
+    """
+    Recorded completion (or a part of it, e.g., `choices[0].message`). Fields
+    are read as attributes, like on a litellm response, without litellm.
+    """
+
+    def __init__(self, data: Mapping[str, Any]):
+        self._data = data
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_") or name not in self._data:
+            raise AttributeError(name)
+        return _wrap(self._data[name])
+
+    def __getitem__(self, name: str) -> Any:
+        return _wrap(self._data[name])
+
+    def __repr__(self) -> str:
+        return f"CachedResponse({self._data!r})"
+
+    def model_dump(self) -> Mapping[str, Any]:
+        return self._data
+
+
+class CompletionCache():
+    """
+    Cache LLM completions by model, messages and completion kwargs.
+
+    Parameters:
+        directory (str | None): Disk tier, one JSON file per completion.
+            Without a directory only the in-memory tier is used.
+        mode (str):
+            - `read_write`: Return cached completions, request and store on a miss.
+            - `record`: Always request and store (refresh recordings).
+            - `replay`: Only return cached completions, raise
+              `CompletionCacheMiss` on a miss (offline runs).
+            - `off`: Always request, never store.
+        max_size (int): Entries of the in-memory tier.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        mode: Literal["read_write", "record", "replay", "off"] = "read_write",
+        max_size: int = 256,
+    ):
+        self._directory = directory
+        self._mode = mode
+        self._memory = LRUCache(max_size=max_size)
+
+    def completion(
+        self,
+        completion: Callable[..., Any],
+        model: str,
+        messages: List[Any],
+        **kwargs: Any
+    ) -> Any:
+        key = self.get_key(model, messages, kwargs)
+        response = self._get_cached_response(key, model)
+        if response is not None:
+            return response
+        response = completion(model=model, messages=messages, **kwargs)
+        self._set_cached_response(key, response)
+        return response
+
+    async def acompletion(
+        self,
+        acompletion: Callable[..., Any],
+        model: str,
+        messages: List[Any],
+        **kwargs: Any
+    ) -> Any:
+        key = self.get_key(model, messages, kwargs)
+        response = self._get_cached_response(key, model)
+        if response is not None:
+            return response
+        response = await acompletion(model=model, messages=messages, **kwargs)
+        self._set_cached_response(key, response)
+        return response
+
+    def get_key(self, model: str, messages: List[Any], kwargs: Mapping[str, Any]) -> str:
+        payload = json.dumps(
+            {
+                "model": model,
+                "messages": [to_dict(message) for message in messages],
+                "kwargs": kwargs,
+            },
+            sort_keys=True, separators=(",", ":"), default=str
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _get_cached_response(self, key: str, model: str) -> Any:
+        if self._mode in ("record", "off"):
+            return None
+        data = self._memory.get(key)
+        if data is None and self._directory is not None:
+            data = self._read_file(key)
+            if data is not None:
+                self._memory.set(key, data)
+        if data is None:
+            if self._mode == "replay":
+                raise CompletionCacheMiss(f"No recorded completion for {model} ({key})")
+            return None
+        return CachedResponse(data)
+
+    def _set_cached_response(self, key: str, response: Any):
+        if self._mode == "off":
+            return
+        data = to_dict(response)
+        self._memory.set(key, data)
+        if self._directory is not None:
+            self._write_file(key, data)
+
+    def _read_file(self, key: str) -> Optional[Mapping[str, Any]]:
+        try:
+            with open(os.path.join(self._directory, f"{key}.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_file(self, key: str, data: Mapping[str, Any]):
+        # Created on the first write, never in `off` mode or by `replay`
+        os.makedirs(self._directory, exist_ok=True)
+        # Write to a temporary file first so that readers never see a partial file
+        fd, temp_path = tempfile.mkstemp(dir=self._directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, default=str)
+        os.replace(temp_path, os.path.join(self._directory, f"{key}.json"))
+
+
+def _wrap(value: Any) -> Any:
+    if isinstance(value, dict):
+        return CachedResponse(value)
+    if isinstance(value, list):
+        return [_wrap(item) for item in value]
+    return value
@@ -0,0 +1,173 @@
+import asyncio
+import csv
+import json
+import sys
+import time
+import traceback
+from typing import Any, Callable, List, Mapping, Optional, TextIO
+
+from agent import Agent
+from instrumentation import LatencyAggregator
+
+# Receives the model and the hooks to pass to `Agent`
+AgentFactory = Callable[[str, List[Callable[[Mapping[str, Any]], Any]]], Agent]
+RESULT_FIELDS = [
+    "model", "provider", "prompt_index", "repetition", "prompt", "final_answer",
+    "finished", "iterations", "errors", "prompt_tokens", "completion_tokens",
+    "total_tokens", "cached_tokens", "wall_time", "exception",
+]
+
+
+def get_provider(model: str) -> str:
+    """litellm provider prefix of a model, e.g. `bedrock` for `bedrock/...`."""
+    if "/" in model:
+        return model.split("/", 1)[0]
+    return "openai"
+
+
+async def run_evaluation_async(
+    create_agent: AgentFactory,
+    models: List[str],
+    prompts: List[str],
+    repetitions: int = 1,
+    max_concurrency: int = 4,
+    provider_concurrency: Optional[Mapping[str, int]] = None,
+    on_result: Optional[Callable[[Mapping[str, Any]], Any]] = None,
+) -> List[Mapping[str, Any]]:
+    """
+    Run every prompt `repetitions` times on every model, concurrently.
+
+    A fresh agent is created for each run. At most `max_concurrency` runs hit
+    the same provider at once, unless the provider has its own limit in
+    `provider_concurrency` (e.g., `{"ollama": 1}`). A failing run is recorded
+    (see `exception`) and never stops the others. Results follow the order of
+    models, prompts and repetitions.
+    """
+    provider_concurrency = provider_concurrency if provider_concurrency is not None else {}  # noqa
+    semaphores = {}
+    for model in models:
+        provider = get_provider(model)
+        if provider not in semaphores:
+            semaphores[provider] = asyncio.Semaphore(
+                provider_concurrency.get(provider, max_concurrency)
+            )
+
+    async def run(model: str, prompt_index: int, repetition: int):
+        provider = get_provider(model)
+        async with semaphores[provider]:
+            result = await _run_once(
+                create_agent, model, provider, prompts[prompt_index],
+                prompt_index, repetition
+            )
+        if on_result is not None:
+            on_result(result)
+        return result
+
+    return await asyncio.gather(*[
+        run(model, prompt_index, repetition)
+        for model in models
+        for prompt_index in range(len(prompts))
+        for repetition in range(repetitions)
+    ])
+
+
+def run_evaluation(*args: Any, **kwargs: Any) -> List[Mapping[str, Any]]:
+    """Sync version of `run_evaluation_async`."""
+    return asyncio.run(run_evaluation_async(*args, **kwargs))
+
+
+async def _run_once(
+    create_agent: AgentFactory,
+    model: str,
+    provider: str,
+    prompt: str,
+    prompt_index: int,
+    repetition: int,
+) -> Mapping[str, Any]:
+    aggregator = LatencyAggregator()
+    final_answer = None
+    exception = None
+    start = time.perf_counter()
+    try:
+        agent = create_agent(model, [aggregator])
+        final_answer = await agent.add_user_message_async(prompt)
+    except Exception as exc:
+        exception = "".join(traceback.format_exception_only(type(exc), exc)).strip()
+    wall_time = time.perf_counter() - start
+    report = aggregator.get_report()
+    tokens = report["tokens"]
+    return {
+        "model": model,
+        "provider": provider,
+        "prompt_index": prompt_index,
+        "repetition": repetition,
+        "prompt": prompt,
+        "final_answer": final_answer,
+        "finished": report["conversations"]["finished"] > 0,
+        "iterations": report["phases"]["iteration"]["count"],
+        "errors": report["errors"],
+        "prompt_tokens": tokens.get("prompt_tokens", 0),
+        "completion_tokens": tokens.get("completion_tokens", 0),
+        "total_tokens": tokens.get("total_tokens", 0),
+        "cached_tokens": tokens.get("cached_tokens", 0),
+        "wall_time": wall_time,
+        "exception": exception,
+    }
+
+
+def summarize_results(results: List[Mapping[str, Any]]) -> List[Mapping[str, Any]]:
+    """One row per model: finish rate, mean iterations, tokens and wall time."""
+    summaries = []
+    for model in dict.fromkeys([result["model"] for result in results]):
+        rows = [result for result in results if result["model"] == model]
+        errors = {}
+        for row in rows:
+            for code, count in row["errors"].items():
+                errors[code] = errors.get(code, 0) + count
+            if row["exception"] is not None:
+                errors["EXCEPTION"] = errors.get("EXCEPTION", 0) + 1
+        summaries.append({
+            "model": model,
+            "runs": len(rows),
+            "finished": len([row for row in rows if row["finished"]]),
+            "mean_iterations": sum([row["iterations"] for row in rows]) / len(rows),
+            "mean_wall_time": sum([row["wall_time"] for row in rows]) / len(rows),
+            "total_tokens": sum([row["total_tokens"] for row in rows]),
+            "errors": errors,
+        })
+    return summaries
+
+
+def print_summary(results: List[Mapping[str, Any]], stream: Optional[TextIO] = None):
+    stream = stream if stream is not None else sys.stdout
+    print(f"{'model':<50} {'runs':>5} {'finished':>9} {'iterations':>11} {'wall (s)':>9} {'tokens':>9}  errors", file=stream)  # noqa
+    for summary in summarize_results(results):
+        print(
+            f"{summary['model']:<50} {summary['runs']:>5} {summary['finished']:>9} "
+            f"{summary['mean_iterations']:>11.2f} {summary['mean_wall_time']:>9.2f} "
+            f"{summary['total_tokens']:>9}  {summary['errors']}",
+            file=stream
+        )
+
+
+def write_csv(results: List[Mapping[str, Any]], path: str):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        for result in results:
+            writer.writerow({
+                **result,
+                "final_answer": _to_text(result["final_answer"]),
+                "errors": json.dumps(result["errors"]),
+            })
+
+
+def write_json(results: List[Mapping[str, Any]], path: str):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, default=str)
+
+
+def _to_text(value: Any) -> Any:
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value, default=str)
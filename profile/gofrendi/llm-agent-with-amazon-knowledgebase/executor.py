@@ -0,0 +1,210 @@
+import asyncio
+import multiprocessing
+import os
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, List, Mapping, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class ToolTimeoutError(TimeoutError):
+    """Raised when a tool runs longer than its timeout."""
+
+
+class ToolProcessError(Exception):
+    """Raised when a tool fails (or its process dies) in a worker process."""
+
+
+class InlineExecutor():
+    """
+    Run tools in the caller's thread (the default). Async agents run sync tools
+    in the default thread pool. No timeout.
+    """
+
+    def run(self, function_name: str, function: Callable, kwargs: Mapping[str, Any]) -> Any:  # noqa
+        return function(**kwargs)
+
+    async def run_async(
+        self, function_name: str, function: Callable, kwargs: Mapping[str, Any]
+    ) -> Any:
+        return await asyncio.to_thread(function, **kwargs)
+
+
+class ThreadExecutor():
+    """
+    Run tools in a dedicated thread pool with a timeout per tool.
+
+    `timeout` (seconds, None: no timeout) can be overridden per function name in
+    `tool_timeout`. A thread can't be killed: on timeout the agent gets a
+    `ToolTimeoutError` right away but the tool keeps its thread until it returns.
+    Use `ProcessExecutor` for tools that may never return.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 8,
+        timeout: Optional[float] = 30,
+        tool_timeout: Optional[Mapping[str, Optional[float]]] = None,
+    ):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._timeout = timeout
+        self._tool_timeout = tool_timeout if tool_timeout is not None else {}
+
+    def run(self, function_name: str, function: Callable, kwargs: Mapping[str, Any]) -> Any:  # noqa
+        timeout = self._tool_timeout.get(function_name, self._timeout)
+        future = self._executor.submit(function, **kwargs)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise ToolTimeoutError(f"{function_name} took more than {timeout} seconds")
+
+    async def run_async(
+        self, function_name: str, function: Callable, kwargs: Mapping[str, Any]
+    ) -> Any:
+        timeout = self._tool_timeout.get(function_name, self._timeout)
+        future = asyncio.wrap_future(self._executor.submit(function, **kwargs))
+        try:
+            return await asyncio.wait_for(future, timeout=timeout)
+        except asyncio.TimeoutError:
+            raise ToolTimeoutError(f"{function_name} took more than {timeout} seconds")
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ProcessExecutor():
+    """
+    Run tools in a pool of worker processes, for CPU-bound or unsafe tools.
+
+    - `timeout` / `tool_timeout`: as in `ThreadExecutor`, but a worker that
+      times out is killed (with everything it started) and replaced.
+    - `memory_limit`: address space limit of every worker in bytes (Unix only),
+      exceeding it raises `MemoryError` inside the tool.
+    Workers are started on demand, up to `max_workers`, and reused. Tools,
+    arguments and results must be picklable (e.g., module-level functions).
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        timeout: Optional[float] = 30,
+        tool_timeout: Optional[Mapping[str, Optional[float]]] = None,
+        memory_limit: Optional[int] = None,
+        start_method: Optional[str] = None,
+    ):
+        self._max_workers = max_workers
+        self._timeout = timeout
+        self._tool_timeout = tool_timeout if tool_timeout is not None else {}
+        self._memory_limit = memory_limit
+        self._context = multiprocessing.get_context(start_method)
+        self._condition = threading.Condition()
+        self._idle_workers: List[Any] = []
+        self._worker_count = 0
+
+    def run(self, function_name: str, function: Callable, kwargs: Mapping[str, Any]) -> Any:  # noqa
+        timeout = self._tool_timeout.get(function_name, self._timeout)
+        worker = self._acquire_worker()
+        process, connection = worker
+        try:
+            connection.send((function, kwargs))
+            timed_out = not connection.poll(timeout)
+            if not timed_out:
+                ok, result = connection.recv()
+        except (EOFError, OSError):
+            self._kill_worker(worker)
+            raise ToolProcessError(
+                f"{function_name} worker process died (exit code {process.exitcode})"
+            )
+        except BaseException:
+            self._release_worker(worker)
+            raise
+        if timed_out:
+            self._kill_worker(worker)
+            raise ToolTimeoutError(f"{function_name} took more than {timeout} seconds")
+        self._release_worker(worker)
+        if not ok:
+            raise ToolProcessError(result)
+        return result
+
+    async def run_async(
+        self, function_name: str, function: Callable, kwargs: Mapping[str, Any]
+    ) -> Any:
+        return await asyncio.to_thread(self.run, function_name, function, kwargs)
+
+    def shutdown(self):
+        with self._condition:
+            workers, self._idle_workers = self._idle_workers, []
+            self._worker_count -= len(workers)
+        for worker in workers:
+            self._kill_worker(worker, release=False)
+
+    def _acquire_worker(self):
+        with self._condition:
+            while len(self._idle_workers) == 0 and self._worker_count >= self._max_workers:  # noqa
+                self._condition.wait()
+            if len(self._idle_workers) > 0:
+                return self._idle_workers.pop()
+            self._worker_count += 1
+        try:
+            return self._start_worker()
+        except Exception:
+            with self._condition:
+                self._worker_count -= 1
+                self._condition.notify()
+            raise
+
+    def _release_worker(self, worker):
+        with self._condition:
+            self._idle_workers.append(worker)
+            self._condition.notify()
+
+    def _start_worker(self):
+        parent_connection, child_connection = self._context.Pipe()
+        process = self._context.Process(
+            target=_work, args=(child_connection, self._memory_limit), daemon=True
+        )
+        process.start()
+        child_connection.close()
+        return process, parent_connection
+
+    def _kill_worker(self, worker, release: bool = True):
+        process, connection = worker
+        try:
+            # Workers lead their own process group, kill subprocesses as well
+            os.killpg(process.pid, signal.SIGKILL)
+        except (AttributeError, OSError):
+            process.kill()
+        process.join()
+        connection.close()
+        if release:
+            with self._condition:
+                self._worker_count -= 1
+                self._condition.notify()
+
+
+def _work(connection: Any, memory_limit: Optional[int]):
+    if hasattr(os, "setsid"):
+        os.setsid()
+    if memory_limit is not None and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    while True:
+        try:
+            function, kwargs = connection.recv()
+        except EOFError:
+            return
+        try:
+            response = (True, function(**kwargs))
+        except BaseException as exc:
+            response = (False, f"{type(exc).__name__}: {exc}")
+        try:
+            connection.send(response)
+        except Exception as exc:
+            # e.g., the result can't be pickled
+            connection.send((False, f"{type(exc).__name__}: {exc}"))
@@ -0,0 +1,154 @@
+import asyncio
+import json
+import time
+from typing import Any, Callable, List, Mapping, Optional, Tuple
+
+from history import get_content, get_role, is_feedback
+
+
+class FakeMessage():
+    def __init__(self, content: Optional[str], tool_calls: Optional[List[Any]] = None):
+        self.role = "assistant"
+        self.content = content
+        self.tool_calls = tool_calls
+
+    def model_dump(self) -> Mapping[str, Any]:
+        return {"role": self.role, "content": self.content}
+
+
+class FakeChoice():
+    def __init__(self, message: FakeMessage):
+        self.message = message
+        self.finish_reason = "stop"
+
+
+class FakeResponse():
+    def __init__(self, model: str, content: str, prompt_tokens: int):
+        completion_tokens = len(content) // 4
+        self.model = model
+        self.choices = [FakeChoice(FakeMessage(content))]
+        self.usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+    def model_dump(self) -> Mapping[str, Any]:
+        return {
+            "model": self.model,
+            "choices": [{"message": self.choices[0].message.model_dump()}],
+            "usage": self.usage,
+        }
+
+
+class FakeDelta():
+    def __init__(self, content: str):
+        self.content = content
+
+
+class FakeChunkChoice():
+    def __init__(self, content: str):
+        self.delta = FakeDelta(content)
+
+
+class FakeChunk():
+    def __init__(self, model: str, content: str, prompt_tokens: int):
+        self.model = model
+        self.prompt_tokens = prompt_tokens
+        self.choices = [FakeChunkChoice(content)]
+
+
+class FakeLLM():
+    """
+    Deterministic, offline completion backend, pass it as `Agent(backend=...)`.
+
+    `respond` receives the request messages and returns the response content.
+    It should only depend on the messages, so one backend can serve many
+    concurrent conversations. `latency` (seconds) is spent on every completion,
+    with `time.sleep` or `asyncio.sleep`, to simulate the provider.
+    """
+
+    def __init__(
+        self,
+        respond: Optional[Callable[[List[Any]], str]] = None,
+        latency: float = 0.0,
+        chunk_size: int = 16,
+    ):
+        self._respond = respond if respond is not None else scripted_responder([])
+        self._latency = latency
+        self._chunk_size = chunk_size
+        self.call_count = 0
+
+    def completion(
+        self, model: str, messages: List[Any], stream: bool = False, **kwargs: Any
+    ) -> Any:
+        if self._latency > 0:
+            time.sleep(self._latency)
+        content, prompt_tokens = self._create_content(messages)
+        if stream:
+            return iter(self._get_chunks(model, content, prompt_tokens))
+        return FakeResponse(model, content, prompt_tokens)
+
+    async def acompletion(
+        self, model: str, messages: List[Any], stream: bool = False, **kwargs: Any
+    ) -> Any:
+        if self._latency > 0:
+            await asyncio.sleep(self._latency)
+        content, prompt_tokens = self._create_content(messages)
+        if stream:
+            return _iterate_async(self._get_chunks(model, content, prompt_tokens))
+        return FakeResponse(model, content, prompt_tokens)
+
+    def stream_chunk_builder(self, chunks: List[FakeChunk], messages: Any = None) -> Any:
+        content = "".join([chunk.choices[0].delta.content for chunk in chunks])
+        return FakeResponse(chunks[0].model, content, chunks[0].prompt_tokens)
+
+    def _create_content(self, messages: List[Any]) -> Tuple[str, int]:
+        self.call_count += 1
+        prompt_tokens = sum([
+            len(get_content(message) or "") for message in messages
+        ]) // 4
+        return self._respond(messages), prompt_tokens
+
+    def _get_chunks(self, model: str, content: str, prompt_tokens: int) -> List[FakeChunk]:  # noqa
+        return [
+            FakeChunk(model, content[index:index + self._chunk_size], prompt_tokens)
+            for index in range(0, len(content), self._chunk_size)
+        ] or [FakeChunk(model, "", prompt_tokens)]
+
+
+def scripted_responder(
+    actions: List[Mapping[str, Any]], final_answer: str = "done"
+) -> Callable[[List[Any]], str]:
+    """
+    Responder that sends `actions[n]` (`{"function": ..., "arguments": ...}`) on
+    the n-th completion of a conversation, then calls `finish_conversation`.
+    The step is the number of assistant messages since the last user question.
+    """
+    responses = [
+        json.dumps({"thought": f"step {index}", "action": action})
+        for index, action in enumerate(actions)
+    ]
+    final_response = json.dumps({
+        "thought": "I have the final answer",
+        "action": {
+            "function": "finish_conversation",
+            "arguments": {"final_answer": final_answer},
+        },
+    })
+
+    def respond(messages: List[Any]) -> str:
+        step = 0
+        for message in reversed(messages):
+            role = get_role(message)
+            if role == "assistant":
+                step += 1
+            elif role == "user" and not is_feedback(message):
+                break
+        return responses[step] if step < len(responses) else final_response
+    return respond
+
+
+async def _iterate_async(chunks: List[FakeChunk]):
+    for chunk in chunks:
+        yield chunk
@@ -0,0 +1,105 @@
+import json
+import time
+from typing import Any, List, Mapping, Optional
+
+from http_client import http_get
+from tool_cache import MemoryCacheBackend
+
+# Parsed results are reused for the same query during this time (seconds)
+SEARCH_CACHE_TTL = 3600
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"  # noqa
+}
+_search_cache = MemoryCacheBackend(max_size=256)
+
+
+def search_google(query: str, num_results: int = 10) -> str:
+    """Search factual information from the internet."""
+    key = json.dumps([query, num_results])
+    entry = _search_cache.get(key)
+    if entry is not None and entry[0] > time.time():
+        return json.dumps(entry[1])
+    search_url = f"https://www.google.com/search?q={query}&num={num_results}"
+    response = http_get(search_url, headers=HEADERS)
+    if response.status_code != 200:
+        raise Exception(f"Error: Unable to retrieve search results (status code: {response.status_code})")  # noqa
+    results = parse_search_results(response.text)
+    _search_cache.set(key, results, time.time() + SEARCH_CACHE_TTL)
+    return json.dumps(results)
+
+
+def parse_search_results(html: str, parser: Optional[str] = None) -> List[Mapping[str, Any]]:  # noqa
+    """
+    Extract `title`, `link` and `snippet` of every result of a Google results
+    page, the same records as `parse_search_results_full`.
+    With lxml (the default when it is installed) the page is parsed in C and
+    only result containers are visited. With `html.parser` (or without lxml),
+    this is `parse_search_results_full`.
+    """
+    lxml_html = _import_lxml_html() if parser in (None, "lxml") else None
+    if lxml_html is not None:
+        return _parse_with_lxml(lxml_html, html)
+    return parse_search_results_full(html)
+
+
+def parse_search_results_full(html: str) -> List[Mapping[str, Any]]:
+    """Reference implementation, parse the whole page with `html.parser`."""
+    from bs4 import BeautifulSoup
+    return _extract_results(BeautifulSoup(html, "html.parser"))
+
+
+def clear_search_cache():
+    _search_cache.clear()
+
+
+def _extract_results(soup: Any) -> List[Mapping[str, Any]]:
+    results = []
+    for g in soup.find_all('div', class_='g'):
+        title_element = g.find('h3')
+        if title_element:
+            title = title_element.text
+            link = g.find('a')['href']
+            snippet_element = g.find('div', class_='VwiC3b')
+            snippet = snippet_element.text if snippet_element else 'No snippet'
+            results.append({
+                'title': title,
+                'link': link,
+                'snippet': snippet
+            })
+    return results
+
+
+def _has_result_class(value: Optional[str]) -> bool:
+    # `class` is the raw attribute (e.g., "g tF2Cxc")
+    return value is not None and "g" in value.split()
+
+
+def _parse_with_lxml(lxml_html: Any, html: str) -> List[Mapping[str, Any]]:
+    if html.strip() == "":
+        return []
+    results = []
+    # `iter` includes the root, e.g., when the page is a single result
+    for g in lxml_html.fromstring(html).iter("div"):
+        if not _has_result_class(g.get("class")):
+            continue
+        title_element = next(g.iter("h3"), None)
+        if title_element is not None:
+            link = next(g.iter("a")).attrib["href"]
+            snippet_element = next((
+                element for element in g.iter("div")
+                if element is not g and "VwiC3b" in (element.get("class") or "").split()  # noqa
+            ), None)
+            results.append({
+                "title": str(title_element.text_content()),
+                "link": str(link),
+                "snippet": str(snippet_element.text_content()) if snippet_element is not None else "No snippet",  # noqa
+            })
+    return results
+
+
+def _import_lxml_html() -> Any:
+    try:
+        import lxml.html
+    except ImportError:
+        return None
+    return lxml.html
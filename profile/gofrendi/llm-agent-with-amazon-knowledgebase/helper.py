@@ -1,5 +1,88 @@
 import inspect
-from typing import get_type_hints, get_origin, get_args, Annotated, Literal
+import json
+import threading
+from collections import OrderedDict
+from typing import get_type_hints, get_origin, get_args, Annotated, Any, Callable, Literal
+
+
+class LRUCache():
+    """Thread safe, size bounded, least recently used cache."""
+
+    def __init__(self, max_size: int = 256):
+        self._max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key: Any, value: Any):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self._max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_metadata_cache = LRUCache(max_size=1024)
+
+
+def get_metadata(func: Callable) -> Any:
+    """
+    Cached version of `extract_metadata`.
+    The result is shared across callers (e.g., every Agent with the same tools),
+    so it should be treated as read only.
+    """
+    key = get_metadata_key(func)
+    metadata = _metadata_cache.get(key)
+    if metadata is None:
+        metadata = extract_metadata(func)
+        _metadata_cache.set(key, metadata)
+    return metadata
+
+
+def clear_metadata_cache():
+    _metadata_cache.clear()
+
+
+def get_metadata_key(func: Callable) -> Any:
+    """
+    Identity of a function's metadata.
+    Functions sharing the same code, name, docstring, defaults and annotations
+    have the same metadata (e.g., a closure created by every Agent instance).
+    Closure cells are left out: metadata only depends on the above, and
+    annotations are evaluated when the closure is created.
+    """
+    code = getattr(func, "__code__", None)
+    if code is None or hasattr(func, "__signature__") or hasattr(func, "__wrapped__"):  # noqa
+        # The signature doesn't come from the code
+        return func
+    kwdefaults = getattr(func, "__kwdefaults__", None) or {}
+    annotations = getattr(func, "__annotations__", None) or {}
+    key = (
+        code,
+        getattr(func, "__name__", None),
+        getattr(func, "__doc__", None),
+        getattr(func, "__defaults__", None),
+        tuple(sorted(kwdefaults.items())),
+        tuple(annotations.items()),
+    )
+    try:
+        hash(key)
+    except TypeError:
+        return func
+    return key
 
 
 def extract_metadata(func):
@@ -74,3 +157,154 @@ def _get_annotation_name(annotation):
         return annotation._name
     return str(annotation)
 
+
+def render_function_schemas(function_schemas: Any, schema_format: str = "json") -> str:
+    """
+    Render function schemas for the system prompt.
+
+    Parameters:
+        function_schemas (dict): Function name to metadata (see `extract_metadata`).
+        schema_format (str): One of:
+            - `json`: indented JSON.
+            - `minified`: JSON without whitespace, redundant `name` and `default`
+              of required arguments (an argument with `default` is optional).
+            - `signature`: Python-like signatures, one function per block.
+
+    Returns:
+        str: The rendered schemas.
+    """
+    if schema_format == "json":
+        return json.dumps(function_schemas, indent=2)
+    if schema_format == "minified":
+        return json.dumps({
+            name: _minify_metadata(metadata)
+            for name, metadata in function_schemas.items()
+        }, separators=(",", ":"))
+    if schema_format == "signature":
+        return "\n".join([
+            _render_signature(metadata) for metadata in function_schemas.values()
+        ])
+    raise ValueError(f"Invalid schema format: {schema_format}")
+
+
+def render_json(data: Any, schema_format: str = "json") -> str:
+    """Render any JSON data, minified unless `schema_format` is `json`."""
+    if schema_format == "json":
+        return json.dumps(data, indent=2)
+    return json.dumps(data, separators=(",", ":"))
+
+
+def _minify_metadata(metadata):
+    arguments = {}
+    for name, argument in metadata["arguments"].items():
+        argument = {
+            key: value for key, value in argument.items()
+            if key != "required" and (key != "default" or not argument["required"])
+        }
+        arguments[name] = argument
+    minified = {"arguments": arguments, "return": metadata["return"]}
+    if metadata["description"]:
+        minified = {"description": metadata["description"], **minified}
+    return minified
+
+
+def _render_signature(metadata):
+    parameters = []
+    descriptions = []
+    for name, argument in metadata["arguments"].items():
+        parameter = f"{name}: {_render_type(argument)}"
+        if not argument["required"]:
+            parameter += f" = {json.dumps(argument['default'])}"
+        parameters.append(parameter)
+        if argument.get("description"):
+            descriptions.append(f"  {name}: {argument['description']}")
+    return_info = metadata["return"]
+    lines = [
+        f"- {metadata['name']}({', '.join(parameters)}) -> {_render_type(return_info)}"
+    ]
+    if metadata["description"]:
+        lines.append(f"  {metadata['description']}")
+    if return_info.get("description"):
+        descriptions.append(f"  return: {return_info['description']}")
+    return "\n".join(lines + descriptions)
+
+
+def _render_type(type_info):
+    type_name = type_info["type"]
+    if type_name == "Literal":
+        return "|".join([json.dumps(value) for value in type_info["values"]])
+    if "elements" in type_info and len(type_info["elements"]) > 0:
+        elements = ", ".join([_render_type(element) for element in type_info["elements"]])  # noqa
+        return f"{type_name}[{elements}]"
+    if "key_type" in type_info:
+        key_type = _render_type(type_info["key_type"])
+        value_type = _render_type(type_info["value_type"])
+        return f"{type_name}[{key_type}, {value_type}]"
+    return type_name
+
+
+def get_tool_definition(metadata: Any) -> Any:
+    """
+    Convert metadata (see `extract_metadata`) into a tool definition for native
+    function calling (OpenAI format, used by litellm's `tools` parameter).
+    """
+    properties = {}
+    required = []
+    for name, argument in metadata["arguments"].items():
+        properties[name] = _get_json_schema(argument)
+        if argument["required"]:
+            required.append(name)
+        elif argument["default"] is not None:
+            properties[name]["default"] = argument["default"]
+    function = {
+        "name": metadata["name"],
+        "parameters": {
+            "type": "object",
+            "properties": properties,
+            "required": required,
+        },
+    }
+    if metadata["description"]:
+        function["description"] = metadata["description"]
+    return {"type": "function", "function": function}
+
+
+_JSON_SCHEMA_TYPES = {
+    "str": "string",
+    "int": "integer",
+    "float": "number",
+    "bool": "boolean",
+}
+
+
+def _get_json_schema(type_info):
+    type_name = type_info["type"]
+    if type_name in _JSON_SCHEMA_TYPES:
+        schema = {"type": _JSON_SCHEMA_TYPES[type_name]}
+    elif type_name == "Literal":
+        schema = {"enum": type_info["values"]}
+    elif type_name in ("list", "tuple", "set", "frozenset", "List", "Tuple", "Set"):
+        schema = {"type": "array"}
+        elements = type_info.get("elements", [])
+        if len(elements) > 0:
+            schema["items"] = _get_json_schema(elements[0])
+    elif type_name in ("dict", "Dict"):
+        schema = {"type": "object"}
+        if "value_type" in type_info:
+            schema["additionalProperties"] = _get_json_schema(type_info["value_type"])
+    else:
+        schema = {}
+    if type_info.get("description"):
+        schema["description"] = type_info["description"]
+    return schema
+
+
+def to_dict(data: Any) -> Any:
+    """Convert a litellm message/response (or any dict) to a JSON serializable dict."""  # noqa
+    if isinstance(data, dict):
+        return data
+    if hasattr(data, "model_dump"):
+        return data.model_dump()
+    if hasattr(data, "dict"):
+        return data.dict()
+    return {"role": getattr(data, "role", None), "content": getattr(data, "content", None)}
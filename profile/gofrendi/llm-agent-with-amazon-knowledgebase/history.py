@@ -0,0 +1,221 @@
+import json
+from typing import Any, Callable, List, Optional
+
+from helper import LRUCache
+
+FEEDBACK_TYPES = ("feedback_success", "feedback_error", "feedback_batch")
+
+
+class HistoryPolicy():
+    """
+    Decide which part of the conversation history is sent to the LLM.
+
+    A policy receives the history (without the system message) and returns the
+    messages to be sent. The stored history is never modified.
+    """
+
+    def apply(self, messages: List[Any]) -> List[Any]:
+        return messages
+
+    def __call__(self, messages: List[Any]) -> List[Any]:
+        return self.apply(messages)
+
+
+class SlidingWindow(HistoryPolicy):
+    """
+    Only send the last `max_messages` messages. The latest question is always
+    sent (before the window when it is older), and the window never starts
+    with tool results (their assistant message would be missing).
+    """
+
+    def __init__(self, max_messages: int = 20):
+        self._max_messages = max_messages
+
+    def apply(self, messages: List[Any]) -> List[Any]:
+        if len(messages) <= self._max_messages:
+            return messages
+        start = len(messages) - self._max_messages
+        question = get_last_question(messages)
+        if question is not None and question >= start:
+            while get_role(messages[start]) != "user":
+                start += 1
+            return messages[start:]
+        while start < len(messages) and get_role(messages[start]) == "tool":
+            start += 1
+        if question is None:
+            return messages[start:]
+        return [messages[question]] + messages[start:]
+
+
+class TruncateToolResults(HistoryPolicy):
+    """
+    Truncate tool results longer than `max_chars`, except for the last
+    `keep_last` messages.
+    """
+
+    def __init__(self, max_chars: int = 2000, keep_last: int = 4):
+        self._max_chars = max_chars
+        self._keep_last = keep_last
+
+    def apply(self, messages: List[Any]) -> List[Any]:
+        cutoff = max(len(messages) - self._keep_last, 0)
+        return [
+            self._truncate_message(message) for message in messages[:cutoff]
+        ] + messages[cutoff:]
+
+    def _truncate_message(self, message: Any) -> Any:
+        content = get_content(message)
+        role = get_role(message)
+        if role not in ("user", "tool") or not isinstance(content, str):
+            return message
+        if len(content) <= self._max_chars:
+            return message
+        if role == "tool":
+            # native function calling result
+            truncated_length = len(content) - self._max_chars
+            return {
+                **message,
+                "content": f"{content[:self._max_chars]}... [{truncated_length} characters truncated]",  # noqa
+            }
+        try:
+            feedback = json.loads(content)
+        except Exception:
+            return message
+        if not isinstance(feedback, dict) or feedback.get("type") not in FEEDBACK_TYPES:
+            return message
+        if feedback["type"] == "feedback_batch":
+            feedback = {
+                **feedback,
+                "feedbacks": [
+                    self._truncate_feedback(item) for item in feedback.get("feedbacks", [])
+                ]
+            }
+        else:
+            feedback = self._truncate_feedback(feedback)
+        return {"role": "user", "content": json.dumps(feedback)}
+
+    def _truncate_feedback(self, feedback: Any) -> Any:
+        if not isinstance(feedback, dict) or "result" not in feedback:
+            return feedback
+        result = feedback["result"]
+        result_str = result if isinstance(result, str) else json.dumps(result)
+        if len(result_str) <= self._max_chars:
+            return feedback
+        truncated_length = len(result_str) - self._max_chars
+        return {
+            **feedback,
+            "result": f"{result_str[:self._max_chars]}... [{truncated_length} characters truncated]",  # noqa
+        }
+
+
+class SummarizeOldTurns(HistoryPolicy):
+    """
+    Replace everything but the last `keep_last` messages with a summary.
+    As in `SlidingWindow`, the latest question is always sent and the kept
+    messages never start with tool results (the assistant message that
+    requested them is kept as well).
+
+    `summarize` receives the old messages and returns the summary text (see
+    `create_litellm_summarizer`). The summary is reused until at least
+    `resummarize_every` new messages are old enough to be summarized, in the
+    meantime those messages are sent as is.
+
+    Summaries are kept per history (list object), so one policy can be shared
+    by many agents; the `max_histories` most recently used are kept.
+    """
+
+    def __init__(
+        self,
+        summarize: Callable[[List[Any]], str],
+        keep_last: int = 6,
+        resummarize_every: int = 10,
+        max_histories: int = 1024,
+    ):
+        self._summarize = summarize
+        self._keep_last = keep_last
+        self._resummarize_every = resummarize_every
+        # id(messages) -> (messages, summarized count, summary), the history
+        # is referenced so that its id can't be reused by another one
+        self._summaries = LRUCache(max_size=max_histories)
+
+    def apply(self, messages: List[Any]) -> List[Any]:
+        cutoff = len(messages) - self._keep_last
+        while cutoff > 0 and get_role(messages[cutoff]) == "tool":
+            cutoff -= 1
+        if cutoff <= 0:
+            return messages
+        entry = self._summaries.get(id(messages))
+        if entry is None or entry[0] is not messages or cutoff < entry[1] or (
+            cutoff - entry[1] >= self._resummarize_every
+        ):
+            entry = (messages, cutoff, self._summarize(messages[:cutoff]))
+            self._summaries.set(id(messages), entry)
+        _, summarized_count, summary_text = entry
+        summary = [{
+            "role": "user",
+            "content": f"Summary of the previous conversation:\n{summary_text}",
+        }]
+        question = get_last_question(messages)
+        if question is not None and question < summarized_count:
+            summary.append(messages[question])
+        return summary + messages[summarized_count:]
+
+
+class ChainedPolicy(HistoryPolicy):
+    """Apply several policies, one after another."""
+
+    def __init__(self, *policies: Callable[[List[Any]], List[Any]]):
+        self._policies = policies
+
+    def apply(self, messages: List[Any]) -> List[Any]:
+        for policy in self._policies:
+            messages = policy(messages)
+        return messages
+
+
+def create_litellm_summarizer(model: str, **kwargs: Any) -> Callable[[List[Any]], str]:
+    """Create a `summarize` function for `SummarizeOldTurns` backed by an LLM."""
+    def summarize(messages: List[Any]) -> str:
+        import litellm
+        conversation = "\n".join([
+            f"{get_role(message)}: {get_content(message)}" for message in messages
+        ])
+        response = litellm.completion(
+            model=model,
+            messages=[
+                {
+                    "role": "system",
+                    "content": "Summarize the conversation. Keep every fact, function result and decision needed to continue it.",  # noqa
+                },
+                {"role": "user", "content": conversation},
+            ],
+            **kwargs
+        )
+        return response.choices[0].message.content
+    return summarize
+
+
+def get_role(message: Any) -> Any:
+    if isinstance(message, dict):
+        return message.get("role")
+    return getattr(message, "role", None)
+
+
+def get_content(message: Any) -> Any:
+    if isinstance(message, dict):
+        return message.get("content")
+    return getattr(message, "content", None)
+
+
+def get_last_question(messages: List[Any]) -> Optional[int]:
+    """Index of the latest user message that is not a feedback."""
+    for index in range(len(messages) - 1, -1, -1):
+        if get_role(messages[index]) == "user" and not is_feedback(messages[index]):
+            return index
+    return None
+
+
+def is_feedback(message: Any) -> bool:
+    """Whether a user message is a function call feedback rather than a question."""
+    content = get_content(message)
+    return isinstance(content, str) and content.startswith('{"type": "feedback')
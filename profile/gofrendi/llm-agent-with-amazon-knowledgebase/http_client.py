@@ -0,0 +1,104 @@
+import threading
+from typing import Any, Mapping, Optional
+
+_lock = threading.Lock()
+_config = {
+    "pool_size": 10,
+    "timeout": 30.0,
+    "max_retries": 0,
+}
+# Settings given to `configure_http`, boto3 keeps botocore defaults otherwise
+_configured = set()
+_http_session = None
+_boto3_clients = {}
+_boto3_region = None
+
+
+def configure_http(
+    pool_size: Optional[int] = None,
+    timeout: Optional[float] = None,
+    max_retries: Optional[int] = None,
+):
+    """
+    Configure the shared clients used by the tools.
+    Existing clients are discarded so that the next call uses the new settings.
+    """
+    global _http_session
+    with _lock:
+        if pool_size is not None:
+            _config["pool_size"] = pool_size
+            _configured.add("pool_size")
+        if timeout is not None:
+            _config["timeout"] = timeout
+            _configured.add("timeout")
+        if max_retries is not None:
+            _config["max_retries"] = max_retries
+            _configured.add("max_retries")
+        if _http_session is not None:
+            _http_session.close()
+        _http_session = None
+        _boto3_clients.clear()
+
+
+def get_http_session() -> Any:
+    """Shared `requests.Session`, connections are kept alive and pooled."""
+    global _http_session
+    if _http_session is not None:
+        return _http_session
+    with _lock:
+        if _http_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=_config["pool_size"],
+                pool_maxsize=_config["pool_size"],
+                max_retries=_config["max_retries"],
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _http_session = session
+        return _http_session
+
+
+def http_get(url: str, **kwargs: Any) -> Any:
+    """`requests.get` on the shared session, with the configured timeout."""
+    kwargs.setdefault("timeout", _config["timeout"])
+    return get_http_session().get(url, **kwargs)
+
+
+def get_boto3_client(service_name: str, **kwargs: Any) -> Any:
+    """
+    Shared boto3 client per service (and client kwargs). Timeouts and retries
+    are botocore defaults unless they were given to `configure_http`.
+    """
+    key = (service_name, tuple(sorted(kwargs.items())))
+    client = _boto3_clients.get(key)
+    if client is not None:
+        return client
+    with _lock:
+        if key not in _boto3_clients:
+            import boto3
+            from botocore.config import Config
+            config_kwargs = {"max_pool_connections": _config["pool_size"]}
+            if "timeout" in _configured:
+                config_kwargs["connect_timeout"] = _config["timeout"]
+                config_kwargs["read_timeout"] = _config["timeout"]
+            if "max_retries" in _configured:
+                config_kwargs["retries"] = {"total_max_attempts": _config["max_retries"] + 1}  # noqa
+            config = Config(**config_kwargs)
+            _boto3_clients[key] = boto3.client(service_name, config=config, **kwargs)
+        return _boto3_clients[key]
+
+
+def get_boto3_region() -> Optional[str]:
+    """Region of the default boto3 session, resolved once."""
+    global _boto3_region
+    if _boto3_region is None:
+        import boto3
+        _boto3_region = boto3.session.Session().region_name
+    return _boto3_region
+
+
+def get_config() -> Mapping[str, Any]:
+    return dict(_config)
@@ -0,0 +1,139 @@
+import json
+import math
+import sys
+import threading
+from typing import Any, List, Mapping, Optional, TextIO
+
+# Events emitted by `Agent` to its hooks. Every event is a dict with `event`,
+# `time` and `iteration` plus:
+# - conversation_start
+# - completion: `model`, `duration`, `usage` (`prompt_tokens`, `completion_tokens`,
+#   `total_tokens`, `cached_tokens`, `cache_creation_tokens`)
+# - parse: `duration`, `ok`, `error` (error code, e.g. MALFORMED PAYLOAD)
+# - tool: `function`, `duration`, `ok`, `error` (e.g. INVALID ARGUMENTS)
+# - timeout: `timeout`
+# - hedge: `model` (hedge model), `winner` (`primary`, `hedge`, or None when no
+#   response was valid)
+# - iteration: `duration`
+# - conversation_end: `iterations`, `duration`, `finished`
+PHASE_EVENTS = ("completion", "parse", "tool", "iteration")
+
+
+class LatencyAggregator():
+    """
+    Hook that collects agent events and reports latency percentiles per phase,
+    iterations per answer, retries per error code, token usage and hedged
+    request winners.
+    Thread safe, one aggregator can be shared by many agents.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._durations = {phase: [] for phase in PHASE_EVENTS}
+        self._conversation_durations = []
+        self._iterations = []
+        self._errors = {}
+        self._tokens = {}
+        self._hedges = {}
+        self._finished = 0
+
+    def __call__(self, event: Mapping[str, Any]):
+        with self._lock:
+            name = event["event"]
+            if name in self._durations:
+                self._durations[name].append(event["duration"])
+            if event.get("error"):
+                self._errors[event["error"]] = self._errors.get(event["error"], 0) + 1
+            if name == "timeout":
+                self._errors["TIMEOUT"] = self._errors.get("TIMEOUT", 0) + 1
+            if name == "hedge":
+                winner = event["winner"] or "none"
+                self._hedges[winner] = self._hedges.get(winner, 0) + 1
+            if name == "completion":
+                for key, value in (event.get("usage") or {}).items():
+                    if value is not None:
+                        self._tokens[key] = self._tokens.get(key, 0) + value
+            if name == "conversation_end":
+                self._iterations.append(event["iterations"])
+                self._conversation_durations.append(event["duration"])
+                self._finished += 1 if event["finished"] else 0
+
+    def get_report(self) -> Mapping[str, Any]:
+        with self._lock:
+            return {
+                "phases": {
+                    phase: _summarize(durations)
+                    for phase, durations in self._durations.items()
+                },
+                "conversations": {
+                    **_summarize(self._conversation_durations),
+                    "finished": self._finished,
+                },
+                "iterations_per_answer": _summarize(self._iterations),
+                "errors": dict(self._errors),
+                "tokens": dict(self._tokens),
+                "hedges": dict(self._hedges),
+            }
+
+    def print_report(self, stream: Optional[TextIO] = None):
+        stream = stream if stream is not None else sys.stdout
+        report = self.get_report()
+        print(f"{'phase':<14} {'count':>6} {'p50 (ms)':>10} {'p95 (ms)':>10} {'mean (ms)':>10}", file=stream)  # noqa
+        for phase, summary in [
+            *report["phases"].items(), ("conversation", report["conversations"])
+        ]:
+            print(
+                f"{phase:<14} {summary['count']:>6} {summary['p50'] * 1000:>10.1f} "
+                f"{summary['p95'] * 1000:>10.1f} {summary['mean'] * 1000:>10.1f}",
+                file=stream
+            )
+        iterations = report["iterations_per_answer"]
+        print(
+            f"iterations per answer: p50={iterations['p50']} "
+            f"p95={iterations['p95']} mean={iterations['mean']:.2f}",
+            file=stream
+        )
+        print(f"errors: {report['errors']}", file=stream)
+        print(f"tokens: {report['tokens']}", file=stream)
+        prompt_tokens = report["tokens"].get("prompt_tokens", 0)
+        if prompt_tokens > 0:
+            cached_tokens = report["tokens"].get("cached_tokens", 0)
+            print(
+                f"prompt cache: {cached_tokens} cached, "
+                f"{prompt_tokens - cached_tokens} uncached "
+                f"({cached_tokens / prompt_tokens:.1%} hit)",
+                file=stream
+            )
+        if report["hedges"]:
+            print(f"hedges: {report['hedges']}", file=stream)
+
+
+class JSONLinesEventWriter():
+    """Hook that writes every event as a JSON line (e.g., to a log file)."""
+
+    def __init__(self, stream: Optional[TextIO] = None):
+        self._stream = stream if stream is not None else sys.stderr
+        self._lock = threading.Lock()
+
+    def __call__(self, event: Mapping[str, Any]):
+        line = json.dumps(event, default=str)
+        with self._lock:
+            self._stream.write(line + "\n")
+
+
+def percentile(values: List[float], ratio: float) -> float:
+    """Nearest-rank percentile, `ratio` is between 0 and 1."""
+    if len(values) == 0:
+        return 0.0
+    ordered = sorted(values)
+    index = max(math.ceil(ratio * len(ordered)) - 1, 0)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def _summarize(values: List[float]) -> Mapping[str, Any]:
+    return {
+        "count": len(values),
+        "p50": percentile(values, 0.5),
+        "p95": percentile(values, 0.95),
+        "mean": sum(values) / len(values) if len(values) > 0 else 0.0,
+    }
@@ -0,0 +1,184 @@
+import json
+import re
+from typing import Any, List, Mapping, Optional, Sequence, Tuple
+
+_decoder = json.JSONDecoder()
+_CLOSERS = {'{': '}', '[': ']'}
+_STRUCTURE_PATTERN = re.compile(r'["{}\[\]]')
+_STRING_END_PATTERN = re.compile(r'["\\]')
+_WHITESPACE_PATTERN = re.compile(r'\s*')
+
+
+def extract_json_object(
+    text: str,
+    preferred_keys: Sequence[str] = ("thought", "action", "actions"),
+    complete_keys: Sequence[str] = ("action", "actions"),
+) -> Mapping[str, Any]:
+    """
+    Extract a JSON object from an LLM response in one linear scan.
+
+    - Fast path: the whole (stripped) text is a JSON object.
+    - Otherwise every top-level `{...}` is a candidate, whatever surrounds it
+      (prose, code fences, other objects). Braces inside JSON strings are ignored.
+      The first candidate containing one of `preferred_keys` wins, then the first
+      valid candidate.
+    - If the text ends inside an object (truncated output), the object is
+      repaired by closing the open string, arrays and objects. Values of
+      `complete_keys` are never repaired: when the text ends inside one of
+      them (e.g., in the middle of a tool argument), nothing is returned.
+
+    Raises:
+        ValueError: No JSON object can be found.
+    """
+    stripped = text.strip()
+    if stripped.startswith('{') and stripped.endswith('}'):
+        try:
+            data = json.loads(stripped)
+            if isinstance(data, dict):
+                return data
+        except ValueError:
+            pass
+    first_valid = None
+    candidates, truncated = _scan(text)
+    for start, end in candidates:
+        data = _loads_object(text[start:end])
+        if data is None:
+            continue
+        if _has_preferred_key(data, preferred_keys):
+            return data
+        if first_valid is None:
+            first_valid = data
+    if truncated is not None:
+        data = None
+        if _get_truncated_key(text[truncated[0]:]) not in complete_keys:
+            data = repair_truncated_json(text[truncated[0]:], truncated[1], truncated[2])  # noqa
+        if data is not None and (first_valid is None or _has_preferred_key(data, preferred_keys)):  # noqa
+            return data
+    if first_valid is not None:
+        return first_valid
+    raise ValueError("No JSON object found")
+
+
+def repair_truncated_json(
+    json_str: str, stack: Optional[List[str]] = None, in_string: Optional[bool] = None
+) -> Optional[Mapping[str, Any]]:
+    """
+    Close a truncated JSON object. `stack` (open brackets) and `in_string` are
+    computed when not provided. Returns None if the object can't be repaired.
+    """
+    if stack is None or in_string is None:
+        _, truncated = _scan(json_str)
+        if truncated is None:
+            return _loads_object(json_str)
+        _, stack, in_string = truncated
+    repaired = json_str
+    if in_string:
+        if repaired.endswith('\\'):
+            repaired = repaired[:-1]
+        repaired += '"'
+    repaired = repaired.rstrip()
+    closers = "".join([_CLOSERS[bracket] for bracket in reversed(stack)])
+    for candidate in (
+        repaired,
+        # dangling `"key":` or `"key": "value",`
+        repaired + " null",
+        repaired.rstrip(',').rstrip(),
+        # dangling key without colon, e.g. `{"thought": "x", "act`
+        repaired[:repaired.rfind(',')] if ',' in repaired else repaired,
+    ):
+        data = _loads_object(candidate + closers)
+        if data is not None:
+            return data
+    return None
+
+
+def _scan(text: str) -> Tuple[List[Tuple[int, int]], Optional[Tuple[int, List[str], bool]]]:  # noqa
+    """
+    Find top-level object boundaries.
+    Returns `(start, end)` of every closed candidate, and `(start, stack, in_string)`
+    of the last unclosed candidate (if any).
+    Precompiled patterns jump straight to the next significant character, so
+    plain text and string contents are skipped in C.
+    """
+    candidates = []
+    stack: List[str] = []
+    start = -1
+    length = len(text)
+    index = 0
+    while index < length:
+        if not stack:
+            # Outside of any object, only an opening brace matters
+            index = text.find('{', index)
+            if index == -1:
+                break
+            start = index
+            stack.append('{')
+            index += 1
+            continue
+        match = _STRUCTURE_PATTERN.search(text, index)
+        if match is None:
+            break
+        char = match.group()
+        index = match.end()
+        if char == '"':
+            # Skip the string, including escaped characters
+            while True:
+                match = _STRING_END_PATTERN.search(text, index)
+                if match is None:
+                    return candidates, (start, stack, True)
+                index = match.end()
+                if match.group() == '"':
+                    break
+                index += 1
+                if index > length:
+                    return candidates, (start, stack, True)
+        elif char == '{' or char == '[':
+            stack.append(char)
+        elif _CLOSERS[stack[-1]] != char:
+            # Mismatched bracket, this candidate is not JSON, drop it
+            stack = []
+        else:
+            stack.pop()
+            if not stack:
+                candidates.append((start, index))
+    if stack:
+        return candidates, (start, stack, False)
+    return candidates, None
+
+
+def _get_truncated_key(json_str: str) -> Optional[str]:
+    """
+    Key of the top-level member the truncated object `json_str` ends in, None
+    when it ends between members (or in a key).
+    """
+    index = 1
+    while True:
+        index = _WHITESPACE_PATTERN.match(json_str, index).end()
+        try:
+            key, index = _decoder.raw_decode(json_str, index)
+        except ValueError:
+            return None
+        index = _WHITESPACE_PATTERN.match(json_str, index).end()
+        if json_str[index:index + 1] != ':':
+            return None
+        index = _WHITESPACE_PATTERN.match(json_str, index + 1).end()
+        try:
+            _, index = _decoder.raw_decode(json_str, index)
+        except ValueError:
+            return key if isinstance(key, str) else None
+        index = _WHITESPACE_PATTERN.match(json_str, index).end()
+        if json_str[index:index + 1] != ',':
+            return None
+        index += 1
+
+
+def _loads_object(json_str: str) -> Optional[Mapping[str, Any]]:
+    try:
+        data, _ = _decoder.raw_decode(json_str)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _has_preferred_key(data: Mapping[str, Any], preferred_keys: Sequence[str]) -> bool:
+    return any(key in data for key in preferred_keys)
@@ -0,0 +1,279 @@
+import argparse
+import glob
+import json
+import os
+import re
+import threading
+import zlib
+from typing import Any, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from helper import LRUCache
+from session_store import LazyList
+
+# Rows multiplied at once by exact search, bounds the memory of a query
+SEARCH_BATCH_SIZE = 65536
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+_index_cache = LRUCache(max_size=8)
+
+
+class HashingEmbedder():
+    """
+    Dependency free embedding stand-in: hashed word unigrams and bigrams,
+    log-scaled and L2 normalized. Similar texts get similar vectors, but it
+    knows nothing about synonyms; any object with `dimension` and
+    `embed(texts) -> (len(texts), dimension) float32 array` can replace it.
+    """
+
+    def __init__(self, dimension: int = 512):
+        self.dimension = dimension
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = _TOKEN_PATTERN.findall(text.lower())
+            features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+            for feature in features:
+                hashed = zlib.crc32(feature.encode())
+                sign = 1.0 if hashed & 0x80000000 else -1.0
+                vectors[row, hashed % self.dimension] += sign
+        vectors = np.sign(vectors) * np.log1p(np.abs(vectors))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+class LocalVectorIndex():
+    """
+    Chunks and their embeddings, stored in `directory`:
+
+    - `embeddings.npy`: one L2 normalized row per chunk, memory-mapped when
+      searching, so only the rows that are scored are read from disk
+    - `chunks.jsonl`: `{"source": ..., "text": ...}` per chunk, decoded lazily
+    - `centroids.npy` / `offsets.npy`: IVF lists (only with `lists`)
+
+    Exact search scores every chunk (cosine similarity, vectorized in
+    batches). With `lists`, chunks are clustered (spherical k-means) and
+    stored list by list; a query only scores the `probes` lists closest to
+    it, which is faster on large corpora at the cost of some recall.
+    `dtype="float16"` halves the size of the matrix.
+
+    Build an index from the text files of a directory, then search it:
+
+        python local_retrieval.py build <documents> <index> [--lists 64]
+        python local_retrieval.py search <index> "amazon revenue Q3 2023"
+    """
+
+    def __init__(self, directory: str, embedder: Optional[Any] = None):
+        self._directory = directory
+        self._embedder = embedder if embedder is not None else HashingEmbedder()
+        self._embeddings: Optional[np.ndarray] = None
+        self._chunks: Optional[LazyList] = None
+        self._centroids: Optional[np.ndarray] = None
+        self._offsets: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    def build(
+        self,
+        documents: Iterable[Tuple[str, str]],
+        chunk_size: int = 800,
+        chunk_overlap: int = 100,
+        lists: Optional[int] = None,
+        dtype: str = "float32",
+        batch_size: int = 256,
+    ) -> int:
+        """
+        Chunk and embed `(source, text)` documents, replace the index.
+        Return the number of chunks.
+        """
+        chunks = [
+            {"source": source, "text": text}
+            for source, document in documents
+            for text in chunk_text(document, chunk_size, chunk_overlap)
+        ]
+        embeddings = np.zeros((len(chunks), self._embedder.dimension), dtype=np.float32)  # noqa
+        for start in range(0, len(chunks), batch_size):
+            embeddings[start:start + batch_size] = self._embedder.embed([
+                chunk["text"] for chunk in chunks[start:start + batch_size]
+            ])
+        os.makedirs(self._directory, exist_ok=True)
+        for name in ("centroids.npy", "offsets.npy"):
+            if os.path.exists(self._get_path(name)):
+                os.remove(self._get_path(name))
+        if lists is not None and len(chunks) > 0:
+            centroids, assignments = _train_lists(embeddings, min(lists, len(chunks)))  # noqa
+            order = np.argsort(assignments, kind="stable")
+            embeddings = embeddings[order]
+            chunks = [chunks[position] for position in order]
+            offsets = np.searchsorted(assignments[order], np.arange(len(centroids) + 1))  # noqa
+            np.save(self._get_path("centroids.npy"), centroids)
+            np.save(self._get_path("offsets.npy"), offsets)
+        np.save(self._get_path("embeddings.npy"), embeddings.astype(dtype))
+        with open(self._get_path("chunks.jsonl"), "w") as f:
+            for chunk in chunks:
+                f.write(json.dumps(chunk) + "\n")
+        with self._lock:
+            self._embeddings = None
+        return len(chunks)
+
+    def search(
+        self, query: str, top_k: int = 10, probes: int = 8
+    ) -> List[Mapping[str, Any]]:
+        """Return the `top_k` chunks most similar to `query`, best first."""
+        self._load()
+        if len(self._chunks) == 0:
+            return []
+        vector = self._embedder.embed([query])[0]
+        if self._centroids is not None:
+            candidates, scores = self._search_lists(vector, top_k, probes)
+        else:
+            candidates, scores = self._search_all(vector, top_k)
+        return [
+            {"score": round(float(score), 4), **self._chunks[int(candidate)]}
+            for candidate, score in zip(candidates, scores)
+        ]
+
+    def _search_all(self, vector: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:  # noqa
+        scores = np.concatenate([
+            _score(self._embeddings[start:start + SEARCH_BATCH_SIZE], vector)
+            for start in range(0, len(self._embeddings), SEARCH_BATCH_SIZE)
+        ])
+        return _top_k(np.arange(len(scores)), scores, top_k)
+
+    def _search_lists(
+        self, vector: np.ndarray, top_k: int, probes: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        lists = np.argsort(-(self._centroids @ vector))[:probes]
+        candidates = np.concatenate([
+            np.arange(self._offsets[index], self._offsets[index + 1]) for index in lists  # noqa
+        ])
+        scores = np.concatenate([
+            _score(self._embeddings[self._offsets[index]:self._offsets[index + 1]], vector)  # noqa
+            for index in lists
+        ])
+        return _top_k(candidates, scores, top_k)
+
+    def _load(self):
+        if self._embeddings is not None:
+            return
+        with self._lock:
+            if self._embeddings is not None:
+                return
+            with open(self._get_path("chunks.jsonl")) as f:
+                self._chunks = LazyList(f.read().splitlines(), json.loads)
+            self._centroids, self._offsets = None, None
+            if os.path.exists(self._get_path("centroids.npy")):
+                self._centroids = np.load(self._get_path("centroids.npy"))
+                self._offsets = np.load(self._get_path("offsets.npy"))
+            # Published last, concurrent searches only check this one
+            self._embeddings = np.load(self._get_path("embeddings.npy"), mmap_mode="r")  # noqa
+
+    def _get_path(self, name: str) -> str:
+        return os.path.join(self._directory, name)
+
+
+def chunk_text(text: str, chunk_size: int = 800, chunk_overlap: int = 100) -> List[str]:  # noqa
+    """
+    Split `text` into chunks of at most `chunk_size` characters, cut at
+    whitespace, consecutive chunks share up to `chunk_overlap` characters.
+    """
+    text = " ".join(text.split())
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        if end < len(text) and text[end] != " " and text.rfind(" ", start, end) > start:  # noqa
+            end = text.rfind(" ", start, end)
+        chunks.append(text[start:end])
+        if end == len(text):
+            break
+        next_start = text.find(" ", max(end - chunk_overlap, start + 1), end)
+        start = next_start + 1 if next_start != -1 else end
+        if text[start] == " ":
+            start += 1
+    return chunks
+
+
+def read_documents(directory: str, extensions: Tuple[str, ...] = (".txt", ".md")) -> Iterable[Tuple[str, str]]:  # noqa
+    """Yield `(relative path, text)` of every text file under `directory`."""
+    for path in sorted(glob.glob(os.path.join(directory, "**", "*"), recursive=True)):  # noqa
+        if os.path.isfile(path) and path.endswith(extensions):
+            with open(path, encoding="utf-8", errors="replace") as f:
+                yield os.path.relpath(path, directory), f.read()
+
+
+def get_local_index(directory: str) -> LocalVectorIndex:
+    """Shared (loaded once) `LocalVectorIndex` of `directory`."""
+    index = _index_cache.get(directory)
+    if index is None:
+        index = LocalVectorIndex(directory)
+        _index_cache.set(directory, index)
+    return index
+
+
+def _score(embeddings: np.ndarray, vector: np.ndarray) -> np.ndarray:
+    return np.asarray(embeddings, dtype=np.float32) @ vector
+
+
+def _top_k(
+    candidates: np.ndarray, scores: np.ndarray, top_k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    if len(scores) > top_k:
+        best = np.argpartition(-scores, top_k)[:top_k]
+        candidates, scores = candidates[best], scores[best]
+    order = np.argsort(-scores, kind="stable")
+    return candidates[order], scores[order]
+
+
+def _train_lists(
+    embeddings: np.ndarray, lists: int, iterations: int = 10, sample_size: int = 256
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Spherical k-means on a sample, return `(centroids, assignment per row)`."""
+    rng = np.random.default_rng(0)
+    sample = embeddings[rng.choice(
+        len(embeddings), min(len(embeddings), lists * sample_size), replace=False
+    )]
+    # k-means++ seeding: spread the initial centroids over the sample
+    centroids = np.zeros((lists, embeddings.shape[1]), dtype=np.float32)
+    centroids[0] = sample[rng.integers(len(sample))]
+    distances = np.maximum(1 - sample @ centroids[0], 0)
+    for index in range(1, lists):
+        total = distances.sum()
+        position = rng.choice(len(sample), p=distances / total) if total > 0 else rng.integers(len(sample))  # noqa
+        centroids[index] = sample[position]
+        distances = np.minimum(distances, np.maximum(1 - sample @ centroids[index], 0))  # noqa
+    for _ in range(iterations):
+        assignments = np.argmax(sample @ centroids.T, axis=1)
+        for index in range(lists):
+            members = sample[assignments == index]
+            if len(members) > 0:
+                centroid = members.sum(axis=0)
+                centroids[index] = centroid / max(np.linalg.norm(centroid), 1e-12)
+    assignments = np.concatenate([
+        np.argmax(embeddings[start:start + SEARCH_BATCH_SIZE] @ centroids.T, axis=1)  # noqa
+        for start in range(0, len(embeddings), SEARCH_BATCH_SIZE)
+    ])
+    return centroids, assignments
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build")
+    build_parser.add_argument("documents")
+    build_parser.add_argument("index")
+    build_parser.add_argument("--lists", type=int, default=None)
+    build_parser.add_argument("--dtype", default="float32")
+    search_parser = subparsers.add_parser("search")
+    search_parser.add_argument("index")
+    search_parser.add_argument("query")
+    search_parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+    if args.command == "build":
+        count = LocalVectorIndex(args.index).build(
+            read_documents(args.documents), lists=args.lists, dtype=args.dtype
+        )
+        print(f"{count} chunks indexed in {args.index}")
+    else:
+        results = LocalVectorIndex(args.index).search(args.query, top_k=args.top_k)
+        print(json.dumps(results, indent=2))
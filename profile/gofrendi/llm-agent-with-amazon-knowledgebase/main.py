@@ -1,37 +1,14 @@
 import json
-import requests
 import os
-import boto3
 from agent import Agent
-from bs4 import BeautifulSoup
+from completion_cache import CompletionCache
+from evaluate import print_summary, run_evaluation, write_csv, write_json
+from google_search import search_google
+from http_client import get_boto3_client, get_boto3_region
+from instrumentation import LatencyAggregator
+from tool_cache import ToolResultCache
 
 
-def search_google(query: str, num_results: int = 10) -> str:
-    """Search factual information from the internet."""
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    }
-    search_url = f"https://www.google.com/search?q={query}&num={num_results}"
-    response = requests.get(search_url, headers=headers)
-    if response.status_code != 200:
-        raise Exception(f"Error: Unable to retrieve search results (status code: {response.status_code})")
-    soup = BeautifulSoup(response.text, 'html.parser')
-    results = []
-    for g in soup.find_all('div', class_='g'):
-        title_element = g.find('h3')
-        if title_element:
-            title = title_element.text
-            link = g.find('a')['href']
-            snippet_element = g.find('div', class_='VwiC3b')
-            snippet = snippet_element.text if snippet_element else 'No snippet'
-            results.append({
-                'title': title,
-                'link': link,
-                'snippet': snippet
-            })
-    return json.dumps(results)
-
-    
 bedrock_system_prompt = """
 You are a question answering agent. I will provide you with a set of search results inside the <search></search> tags. The user will provide you with a question inside <question></question> tags. Your job is to answer the user's question using only information from the search results ONLY. 
 
@@ -45,10 +22,14 @@ If the search results do not contain information that can answer the question, r
 
 def search_amazon_revenue(query: str) -> str:
     """Search anything related to amazon revenue"""
-    boto3_session = boto3.session.Session()
-    region = boto3_session.region_name
-    # create a boto3 bedrock client
-    bedrock_agent_runtime_client = boto3.client('bedrock-agent-runtime')
+    # Set KNOWLEDGE_BASE_BACKEND=local to search a local index (offline, no generation)
+    if os.environ.get("KNOWLEDGE_BASE_BACKEND") == "local":
+        from local_retrieval import get_local_index
+        index = get_local_index(os.environ.get("LOCAL_INDEX_DIR", ".local_index"))
+        return json.dumps(index.search(query, top_k=10))
+    region = get_boto3_region()
+    # get the shared boto3 bedrock client
+    bedrock_agent_runtime_client = get_boto3_client('bedrock-agent-runtime')
     # get knowledge base id from environment variable
     kb_id = os.environ.get("KNOWLEDGE_BASE_ID", "XWOE7Z7HRI")
     #print (kb_id)
@@ -112,20 +93,49 @@ tools = [
     search_google,
 ]
 input = "How much is amazon revenue on Q3 2023? Compare it with Meta"
-for model in models:
-    print()
-    print(f"--- {model}")
-    agent = Agent(
+tool_cache = ToolResultCache(ttl=3600)
+latency_aggregator = LatencyAggregator()
+# Set COMPLETION_CACHE_MODE=replay to rerun recorded conversations offline
+completion_cache = CompletionCache(
+    directory=os.environ.get("COMPLETION_CACHE_DIR", ".completion_cache"),
+    mode=os.environ.get("COMPLETION_CACHE_MODE", "off"),
+)
+
+
+def create_agent(model, hooks):
+    return Agent(
         model=model,
         tools=tools,
-        max_iteration=10
+        max_iteration=10,
+        parallel_actions=True,
+        tool_cache=tool_cache,
+        completion_cache=completion_cache,
+        hooks=[latency_aggregator, *hooks],
+        verbose=False,
     )
-    # result1 = agent.add_user_message()  # noqa
-    result = agent.add_user_message(input)  # noqa
-    print(f"--- {model} history")
-    history = agent.get_history()
-    for message in history:
-        print(f"- {message}")
-    print(f"Total message: {len(history)}")
-    print(f"--- {model} final answer")
-    print(result)
+
+
+if __name__ == "__main__":
+    # All models run concurrently, at most 4 runs per provider (1 for ollama) at once
+    results = run_evaluation(
+        create_agent,
+        models,
+        [input],
+        repetitions=int(os.environ.get("EVALUATION_REPETITIONS", "1")),
+        provider_concurrency={"ollama": 1},
+    )
+    for result in results:
+        print()
+        print(f"--- {result['model']} final answer")
+        print(result["exception"] or result["final_answer"])
+    print()
+    print_summary(results)
+    if os.environ.get("EVALUATION_OUTPUT"):
+        output = os.environ["EVALUATION_OUTPUT"]
+        if output.endswith(".csv"):
+            write_csv(results, output)
+        else:
+            write_json(results, output)
+    print(f"--- Tool cache: {tool_cache.get_stats()}")
+    print("--- Latency")
+    latency_aggregator.print_report()
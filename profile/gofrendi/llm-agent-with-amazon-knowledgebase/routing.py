@@ -0,0 +1,61 @@
+from typing import Any, Callable, List, Mapping, Optional
+
+
+class ModelRouter():
+    """
+    Choose the model of every completion, pass it as `Agent(router=...)`.
+
+    The router is also registered as the agent's first hook, so it sees every
+    event (see `instrumentation.py`) before choosing the next model.
+    A router keeps per-conversation state, use one router per agent.
+    """
+
+    def get_model(self, default_model: str, messages: List[Any]) -> str:
+        return default_model
+
+    def __call__(self, event: Mapping[str, Any]):
+        pass
+
+
+class EscalationRouter(ModelRouter):
+    """
+    Run iterations on a fast, cheap `model` and escalate to `strong_model`:
+    - after `max_errors` consecutive failed iterations (parse, validation or
+      execution error, timeout), until an iteration succeeds
+    - for hard steps, when `is_hard(messages)` returns True
+    `model` defaults to the agent's model.
+    """
+
+    def __init__(
+        self,
+        strong_model: str,
+        model: Optional[str] = None,
+        max_errors: int = 2,
+        is_hard: Optional[Callable[[List[Any]], bool]] = None,
+    ):
+        self._strong_model = strong_model
+        self._model = model
+        self._max_errors = max_errors
+        self._is_hard = is_hard
+        self._consecutive_errors = 0
+        self._failed = False
+
+    def get_model(self, default_model: str, messages: List[Any]) -> str:
+        if self._consecutive_errors >= self._max_errors:
+            return self._strong_model
+        if self._is_hard is not None and self._is_hard(messages):
+            return self._strong_model
+        return self._model if self._model is not None else default_model
+
+    def __call__(self, event: Mapping[str, Any]):
+        name = event["event"]
+        if name == "conversation_start":
+            self._consecutive_errors = 0
+            self._failed = False
+        elif name in ("parse", "tool") and not event["ok"]:
+            self._failed = True
+        elif name == "timeout":
+            self._failed = True
+        elif name == "iteration":
+            self._consecutive_errors = self._consecutive_errors + 1 if self._failed else 0  # noqa
+            self._failed = False
@@ -0,0 +1,361 @@
+import asyncio
+import json
+import signal
+import time
+import uuid
+from typing import Any, Callable, Mapping, Optional, Tuple
+
+from agent import Agent
+from helper import LRUCache
+
+# Receives the session key (`<tenant>/<session_id>`) and returns a new Agent
+SessionAgentFactory = Callable[[str], Agent]
+MAX_BODY_SIZE = 1024 * 1024
+_STATUS_TEXT = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    413: "Payload Too Large", 429: "Too Many Requests", 500: "Internal Server Error",  # noqa
+    503: "Service Unavailable", 504: "Gateway Timeout",
+}
+
+
+class ServerError(Exception):
+    """Raised by `AgentServer.ask` when a question is rejected or fails."""
+
+    def __init__(self, status: int, message: str, retry_after: Optional[float] = None):  # noqa
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class AgentServer():
+    """
+    Serve `Agent` sessions over HTTP, on a bounded worker pool.
+
+    - `POST /ask` with `{"question": ..., "session_id": ..., "tenant": ...}`
+      (`session_id` and `tenant` are optional) returns
+      `{"session_id": ..., "final_answer": ..., "duration": ...}`.
+    - `GET /stats` returns the counters of `get_stats`, `GET /health` returns
+      503 once the server is shutting down.
+
+    At most `max_workers` agent loops run at once, `max_queue` more questions
+    may wait for a worker. Admission control rejects anything above that
+    (503), above `max_tenant_requests` in flight or queued for one tenant
+    (429), and everything once `shutdown` is called (503). Every question has
+    `request_timeout` seconds (queueing included) before it is cancelled (504).
+
+    `create_agent` is called once per session. Agents are kept in memory (the
+    `max_sessions` most recently used), questions of the same session run one
+    at a time. Give agents a `session_store` (keyed by the session key) to keep
+    evicted sessions, or to resume them in another process.
+
+    The server is an ASGI application (e.g., `uvicorn module:server`), and can
+    also serve plain HTTP/1.1 by itself with `serve`.
+    """
+
+    def __init__(
+        self,
+        create_agent: SessionAgentFactory,
+        max_workers: int = 16,
+        max_queue: int = 64,
+        max_tenant_requests: Optional[int] = None,
+        request_timeout: Optional[float] = 120,
+        max_sessions: int = 1024,
+    ):
+        self._create_agent = create_agent
+        self._max_workers = max_workers
+        self._max_queue = max_queue
+        self._max_tenant_requests = max_tenant_requests
+        self._request_timeout = request_timeout
+        self._sessions = LRUCache(max_size=max_sessions)
+        self._workers: Optional[asyncio.Semaphore] = None
+        self._tasks = set()
+        self._idle_connections = set()
+        self._tenant_requests = {}
+        self._closing = False
+        self._running = 0
+        self._queued = 0
+        self._stats = {
+            "accepted": 0, "rejected": 0, "completed": 0, "failed": 0, "timed_out": 0,  # noqa
+        }
+
+    def get_stats(self) -> Mapping[str, Any]:
+        return {
+            **self._stats,
+            "running": self._running,
+            "queued": self._queued,
+            "max_workers": self._max_workers,
+            "max_queue": self._max_queue,
+            "closing": self._closing,
+        }
+
+    async def ask(
+        self, question: str, session_id: Optional[str] = None, tenant: str = "default"  # noqa
+    ) -> Mapping[str, Any]:
+        """
+        Run `question` in a session, raise `ServerError` when the question is
+        rejected, times out or the agent fails.
+        """
+        self._admit(tenant)
+        session_id = session_id if session_id is not None else uuid.uuid4().hex
+        start = time.perf_counter()
+        task = asyncio.ensure_future(self._run(f"{tenant}/{session_id}", question))
+        self._tasks.add(task)
+        self._tenant_requests[tenant] = self._tenant_requests.get(tenant, 0) + 1
+        try:
+            final_answer = await asyncio.wait_for(task, timeout=self._request_timeout)
+        except asyncio.TimeoutError:
+            self._stats["timed_out"] += 1
+            raise ServerError(504, f"No answer after {self._request_timeout} seconds")  # noqa
+        except asyncio.CancelledError:
+            if task.cancelled() and self._closing:
+                self._stats["failed"] += 1
+                raise ServerError(503, "Server is shutting down")
+            raise
+        except Exception as exc:
+            self._stats["failed"] += 1
+            raise ServerError(500, f"{type(exc).__name__}: {exc}")
+        finally:
+            self._tasks.discard(task)
+            self._tenant_requests[tenant] -= 1
+            if self._tenant_requests[tenant] == 0:
+                del self._tenant_requests[tenant]
+        self._stats["completed"] += 1
+        return {
+            "session_id": session_id,
+            "final_answer": final_answer,
+            "duration": time.perf_counter() - start,
+        }
+
+    async def shutdown(self, drain_timeout: Optional[float] = 30):
+        """
+        Stop accepting questions, wait up to `drain_timeout` seconds for the
+        running and queued ones, then cancel what is left.
+        """
+        self._closing = True
+        tasks = list(self._tasks)
+        if len(tasks) == 0:
+            return
+        _, pending = await asyncio.wait(tasks, timeout=drain_timeout)
+        for task in pending:
+            task.cancel()
+        if len(pending) > 0:
+            await asyncio.wait(pending)
+
+    async def serve(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8000,
+        drain_timeout: Optional[float] = 30,
+        ready: Optional[Callable[[int], Any]] = None,
+    ):
+        """
+        Serve HTTP/1.1 (keep-alive, no TLS) until SIGINT/SIGTERM, or until the
+        task is cancelled, then drain with `shutdown`. `ready` receives the
+        listening port (useful with `port=0`).
+        """
+        stopped = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        signal_numbers = []
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signal_number, stopped.set)
+                signal_numbers.append(signal_number)
+            except (NotImplementedError, RuntimeError):  # Windows, or not main thread  # noqa
+                pass
+        server = await asyncio.start_server(self._handle_connection, host, port)
+        if ready is not None:
+            ready(server.sockets[0].getsockname()[1])
+        try:
+            await stopped.wait()
+        finally:
+            server.close()
+            await self.shutdown(drain_timeout)
+            # Busy connections close after their response, idle ones right away
+            for writer in list(self._idle_connections):
+                writer.close()
+            await server.wait_closed()
+            for signal_number in signal_numbers:
+                loop.remove_signal_handler(signal_number)
+
+    async def __call__(self, scope: Mapping[str, Any], receive: Callable, send: Callable):  # noqa
+        if scope["type"] == "lifespan":
+            await self._handle_lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+        status, headers, payload = await self.handle(scope["method"], scope["path"], body)  # noqa
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (key.lower().encode(), value.encode()) for key, value in headers.items()  # noqa
+            ],
+        })
+        await send({"type": "http.response.body", "body": payload})
+
+    async def handle(
+        self, method: str, path: str, body: bytes
+    ) -> Tuple[int, Mapping[str, str], bytes]:
+        """Handle one request, return `(status, headers, body)`."""
+        path = path.split("?", 1)[0]
+        if path == "/health":
+            if self._closing:
+                return _json_response(503, {"status": "shutting down"})
+            return _json_response(200, {"status": "ok"})
+        if path == "/stats":
+            return _json_response(200, self.get_stats())
+        if path != "/ask":
+            return _json_response(404, {"error": f"Not found: {path}"})
+        if method != "POST":
+            return _json_response(405, {"error": "Use POST"})
+        if len(body) > MAX_BODY_SIZE:
+            return _json_response(413, {"error": "Request body is too large"})
+        try:
+            data = json.loads(body)
+            question = data["question"]
+            if not isinstance(question, str):
+                raise ValueError("question should be a string")
+        except (ValueError, KeyError, TypeError) as exc:
+            return _json_response(400, {"error": f"Invalid request: {exc}"})
+        try:
+            result = await self.ask(
+                question,
+                session_id=data.get("session_id"),
+                tenant=str(data.get("tenant", "default")),
+            )
+        except ServerError as exc:
+            headers = {}
+            if exc.retry_after is not None:
+                headers["Retry-After"] = str(int(exc.retry_after))
+            return _json_response(exc.status, {"error": str(exc)}, headers)
+        return _json_response(200, result)
+
+    def _admit(self, tenant: str):
+        if self._closing:
+            self._stats["rejected"] += 1
+            raise ServerError(503, "Server is shutting down")
+        if self._workers is None:
+            self._workers = asyncio.Semaphore(self._max_workers)
+        if len(self._tasks) >= self._max_workers + self._max_queue:
+            self._stats["rejected"] += 1
+            raise ServerError(503, "Server is overloaded", retry_after=1)
+        tenant_requests = self._tenant_requests.get(tenant, 0)
+        if self._max_tenant_requests is not None and tenant_requests >= self._max_tenant_requests:  # noqa
+            self._stats["rejected"] += 1
+            raise ServerError(429, f"Too many requests for tenant {tenant}", retry_after=1)  # noqa
+        self._stats["accepted"] += 1
+
+    async def _run(self, session_key: str, question: str) -> Any:
+        agent, lock = self._get_session(session_key)
+        self._queued += 1
+        try:
+            # Questions waiting for their session don't hold a worker
+            await lock.acquire()
+            try:
+                await self._workers.acquire()
+            except BaseException:
+                lock.release()
+                raise
+        finally:
+            self._queued -= 1
+        self._running += 1
+        try:
+            return await agent.add_user_message_async(question)
+        finally:
+            self._running -= 1
+            self._workers.release()
+            lock.release()
+
+    def _get_session(self, session_key: str) -> Tuple[Agent, asyncio.Lock]:
+        session = self._sessions.get(session_key)
+        if session is None:
+            session = (self._create_agent(session_key), asyncio.Lock())
+            self._sessions.set(session_key, session)
+        return session
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        try:
+            while True:
+                self._idle_connections.add(writer)
+                try:
+                    request = await _read_request(reader)
+                finally:
+                    self._idle_connections.discard(writer)
+                if request is None or self._closing:
+                    break
+                method, path, headers, body = request
+                if body is None:
+                    status, response_headers, payload = _json_response(
+                        413, {"error": "Request body is too large"}
+                    )
+                else:
+                    status, response_headers, payload = await self.handle(method, path, body)  # noqa
+                keep_alive = body is not None and not self._closing and headers.get("connection", "").lower() != "close"  # noqa
+                writer.write(_encode_response(status, response_headers, payload, keep_alive))  # noqa
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_lifespan(self, receive: Callable, send: Callable):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Mapping[str, str], Optional[bytes]]]:  # noqa
+    """Read one HTTP/1.1 request, the body is None when it is too large."""
+    request_line = await reader.readline()
+    if request_line.strip() == b"":
+        return None
+    method, path, _ = request_line.decode("latin-1").split(" ", 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        key, value = line.decode("latin-1").split(":", 1)
+        headers[key.strip().lower()] = value.strip()
+    content_length = int(headers.get("content-length", "0"))
+    if content_length > MAX_BODY_SIZE:
+        return method, path, headers, None
+    body = await reader.readexactly(content_length) if content_length > 0 else b""
+    return method, path, headers, body
+
+
+def _encode_response(
+    status: int, headers: Mapping[str, str], body: bytes, keep_alive: bool
+) -> bytes:
+    lines = [
+        f"HTTP/1.1 {status} {_STATUS_TEXT.get(status, '')}",
+        *[f"{key}: {value}" for key, value in headers.items()],
+        f"Content-Length: {len(body)}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+
+def _json_response(
+    status: int, data: Any, headers: Optional[Mapping[str, str]] = None
+) -> Tuple[int, Mapping[str, str], bytes]:
+    return (
+        status,
+        {"Content-Type": "application/json", **(headers if headers is not None else {})},  # noqa
+        json.dumps(data, default=str).encode(),
+    )
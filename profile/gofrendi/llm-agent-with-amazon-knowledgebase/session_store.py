@@ -0,0 +1,154 @@
+import json
+import os
+import sqlite3
+import threading
+from collections.abc import MutableSequence
+from typing import Any, Callable, List, Optional, Tuple
+
+from helper import to_dict
+
+
+class LazyList(MutableSequence):
+    """
+    List whose stored items are decoded on first access.
+
+    Loaded items are kept raw (e.g., a JSON line) and decoded by `decode` only
+    when read, so slicing the tail of a long history (e.g., `SlidingWindow`)
+    doesn't parse the rest. Items added later are stored as is.
+    """
+
+    def __init__(self, raw_items: List[Any], decode: Callable[[Any], Any]):
+        self._items = list(raw_items)
+        self._decoded = [False] * len(self._items)
+        self._decode = decode
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __getitem__(self, index: Any) -> Any:
+        if isinstance(index, slice):
+            return [self._get(position) for position in range(*index.indices(len(self)))]  # noqa
+        if index < 0:
+            index += len(self._items)
+        if index < 0 or index >= len(self._items):
+            raise IndexError("list index out of range")
+        return self._get(index)
+
+    def __setitem__(self, index: int, value: Any):
+        self._items[index] = value
+        self._decoded[index] = True
+
+    def __delitem__(self, index: Any):
+        del self._items[index]
+        del self._decoded[index]
+
+    def insert(self, index: int, value: Any):
+        self._items.insert(index, value)
+        self._decoded.insert(index, True)
+
+    def __repr__(self) -> str:
+        return f"LazyList({len(self)} items)"
+
+    def _get(self, index: int) -> Any:
+        if not self._decoded[index]:
+            self._items[index] = self._decode(self._items[index])
+            self._decoded[index] = True
+        return self._items[index]
+
+
+class JSONLSessionStore():
+    """
+    Append-only JSON lines store, one `<session_id>.jsonl` file per session in
+    `directory`. Every message is written (and flushed) as soon as it is added,
+    set `fsync` to also survive an OS crash.
+    """
+
+    def __init__(self, directory: str, fsync: bool = False):
+        self._directory = directory
+        self._fsync = fsync
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def append(self, session_id: str, message: Any, model: Optional[str] = None):
+        line = json.dumps({"model": model, "message": to_dict(message)}, default=str)
+        with self._lock, open(self._get_path(session_id), "a") as f:
+            f.write(line + "\n")
+            f.flush()
+            if self._fsync:
+                os.fsync(f.fileno())
+
+    def load(self, session_id: str) -> Tuple[LazyList, LazyList]:
+        """
+        Return `(messages, models)` of a session, decoded lazily.
+        A partial last line left by a crash is removed from the file, so that
+        the next `append` starts on a new line.
+        """
+        try:
+            with self._lock, open(self._get_path(session_id), "r+b") as f:
+                content = f.read()
+                end = content.rfind(b"\n") + 1
+                if end < len(content):
+                    f.truncate(end)
+        except FileNotFoundError:
+            content, end = b"", 0
+        lines = [line for line in content[:end].decode().split("\n") if line != ""]  # noqa
+        return (
+            LazyList(lines, lambda line: json.loads(line)["message"]),
+            LazyList(lines, lambda line: json.loads(line)["model"]),
+        )
+
+    def clear(self, session_id: str):
+        with self._lock:
+            try:
+                os.remove(self._get_path(session_id))
+            except FileNotFoundError:
+                pass
+
+    def _get_path(self, session_id: str) -> str:
+        return os.path.join(self._directory, f"{session_id}.jsonl")
+
+
+class SQLiteSessionStore():
+    """
+    SQLite store, shared by many sessions (and processes). Every message is
+    committed as soon as it is added.
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS session_messages ("
+                "session_id TEXT, position INTEGER, model TEXT, message TEXT, "
+                "PRIMARY KEY (session_id, position))"
+            )
+
+    def append(self, session_id: str, message: Any, model: Optional[str] = None):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT INTO session_messages "
+                "SELECT ?, COALESCE(MAX(position), -1) + 1, ?, ? "
+                "FROM session_messages WHERE session_id = ?",
+                (session_id, model, json.dumps(to_dict(message), default=str), session_id)  # noqa
+            )
+
+    def load(self, session_id: str) -> Tuple[LazyList, List[Optional[str]]]:
+        """Return `(messages, models)` of a session, messages are decoded lazily."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT model, message FROM session_messages "
+                "WHERE session_id = ? ORDER BY position",
+                (session_id,)
+            ).fetchall()
+        return (
+            LazyList([row[1] for row in rows], json.loads),
+            [row[0] for row in rows],
+        )
+
+    def clear(self, session_id: str):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM session_messages WHERE session_id = ?", (session_id,)
+            )
+
@@ -0,0 +1,157 @@
+import json
+from typing import Any, Callable, List, Mapping, Optional
+
+_ESCAPE_MAP = {
+    '"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'
+}
+
+
+class StreamingResponseParser():
+    """
+    Incremental parser for streamed agent responses.
+
+    Feed the response chunk by chunk. The parser only looks at the first top-level
+    JSON object (anything before it, like a code fence, is ignored) and:
+    - Sends the decoded `thought` characters to `on_thought` as soon as they arrive.
+    - Sends every `action` object (or every element of `actions`) to `on_action`
+      as soon as the object is closed, before the rest of the response is generated.
+    """
+
+    def __init__(
+        self,
+        on_thought: Optional[Callable[[str], Any]] = None,
+        on_action: Optional[Callable[[Mapping[str, Any]], Any]] = None,
+    ):
+        self._on_thought = on_thought
+        self._on_action = on_action
+        self._buffer: List[str] = []
+        self._position = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = ""
+        # `\ud83d` of `\ud83d\ude00`, waiting for its low surrogate
+        self._high_surrogate = ""
+        self._string_start = -1
+        self._key = None
+        self._expect_key = False
+        self._streaming_thought = False
+        self._action_start = -1
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    def get_text(self) -> str:
+        return "".join(self._buffer)
+
+    def feed(self, chunk: str):
+        if self._done or not chunk:
+            return
+        thought_chars = []
+        for char in chunk:
+            self._buffer.append(char)
+            position = self._position
+            self._position += 1
+            if self._in_string:
+                self._feed_string_char(char, thought_chars)
+                continue
+            if char == '"' and len(self._stack) > 0:
+                self._in_string = True
+                self._string_start = position
+                self._streaming_thought = (
+                    len(self._stack) == 1 and not self._expect_key and
+                    self._key == "thought"
+                )
+            elif char == '{':
+                self._stack.append(char)
+                self._expect_key = True
+                self._start_action(position)
+            elif char == '[' and len(self._stack) > 0:
+                self._stack.append(char)
+                self._expect_key = False
+            elif char in '}]' and len(self._stack) > 0:
+                self._stack.pop()
+                self._expect_key = False
+                self._end_action(position)
+                if len(self._stack) == 0:
+                    self._done = True
+                    break
+            elif char == ',' and len(self._stack) > 0:
+                self._expect_key = self._stack[-1] == '{'
+            elif char == ':':
+                self._expect_key = False
+        if len(thought_chars) > 0 and self._on_thought is not None:
+            self._on_thought("".join(thought_chars))
+
+    def _feed_string_char(self, char: str, thought_chars: List[str]):
+        if self._escape:
+            self._escape += char
+            if self._escape[1] == 'u' and len(self._escape) < 6:
+                return
+            if self._streaming_thought:
+                self._append_thought(self._decode_escape(self._escape), thought_chars)  # noqa
+            self._escape = ""
+            return
+        if char == '\\':
+            self._escape = char
+            return
+        if char == '"':
+            if self._streaming_thought and self._high_surrogate:
+                thought_chars.append("\ufffd")
+            self._high_surrogate = ""
+            self._in_string = False
+            self._streaming_thought = False
+            if len(self._stack) == 1 and self._expect_key:
+                self._key = json.loads(
+                    "".join(self._buffer[self._string_start:self._position])
+                )
+            return
+        if self._streaming_thought:
+            self._append_thought(char, thought_chars)
+
+    def _append_thought(self, text: str, thought_chars: List[str]):
+        # Characters outside the BMP are escaped as surrogate pairs, a lone
+        # surrogate can't be encoded and is replaced
+        if self._high_surrogate:
+            high, self._high_surrogate = self._high_surrogate, ""
+            if "\udc00" <= text <= "\udfff":
+                text = (high + text).encode("utf-16", "surrogatepass").decode("utf-16")  # noqa
+            else:
+                thought_chars.append("\ufffd")
+        if "\ud800" <= text <= "\udbff":
+            self._high_surrogate = text
+            return
+        if "\udc00" <= text <= "\udfff":
+            text = "\ufffd"
+        thought_chars.append(text)
+
+    def _decode_escape(self, escape: str) -> str:
+        if escape[1] == 'u':
+            try:
+                return chr(int(escape[2:], 16))
+            except ValueError:
+                return escape
+        return _ESCAPE_MAP.get(escape[1], escape[1])
+
+    def _start_action(self, position: int):
+        is_action = len(self._stack) == 2 and self._key == "action"
+        is_actions_element = (
+            len(self._stack) == 3 and self._stack[1] == '[' and self._key == "actions"
+        )
+        if is_action or is_actions_element:
+            self._action_start = position
+
+    def _end_action(self, position: int):
+        if self._action_start == -1:
+            return
+        if len(self._stack) == 1 and self._key == "action" or (
+            len(self._stack) == 2 and self._key == "actions"
+        ):
+            action_str = "".join(self._buffer[self._action_start:position + 1])
+            self._action_start = -1
+            try:
+                action = json.loads(action_str)
+            except Exception:
+                return
+            if self._on_action is not None:
+                self._on_action(action)
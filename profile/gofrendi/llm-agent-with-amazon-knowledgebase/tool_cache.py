@@ -0,0 +1,134 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Mapping, Optional, Tuple
+
+from helper import LRUCache
+
+
+class MemoryCacheBackend():
+    """In-memory LRU backend, entries are `(expires_at, value)` tuples."""
+
+    def __init__(self, max_size: int = 1024):
+        self._cache = LRUCache(max_size=max_size)
+
+    def get(self, key: str) -> Optional[Tuple[Optional[float], Any]]:
+        return self._cache.get(key)
+
+    def set(self, key: str, value: Any, expires_at: Optional[float]):
+        self._cache.set(key, (expires_at, value))
+
+    def clear(self):
+        self._cache.clear()
+
+
+class SQLiteCacheBackend():
+    """
+    On-disk backend, shared across processes and sessions.
+    Values should be JSON serializable. The least recently used entries are
+    removed once there are more than `max_size` entries.
+    """
+
+    def __init__(self, path: str, max_size: int = 10000):
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS tool_cache ("
+                "key TEXT PRIMARY KEY, value TEXT, expires_at REAL, accessed_at REAL)"
+            )
+
+    def get(self, key: str) -> Optional[Tuple[Optional[float], Any]]:
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT value, expires_at FROM tool_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._connection.execute(
+                "UPDATE tool_cache SET accessed_at = ? WHERE key = ?", (time.time(), key)
+            )
+        return row[1], json.loads(row[0])
+
+    def set(self, key: str, value: Any, expires_at: Optional[float]):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO tool_cache VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), expires_at, time.time())
+            )
+            self._connection.execute(
+                "DELETE FROM tool_cache WHERE key IN ("
+                "SELECT key FROM tool_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self._max_size,)
+            )
+
+    def clear(self):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM tool_cache")
+
+
+class ToolResultCache():
+    """
+    Memoize tool results by function name and arguments.
+
+    Parameters:
+        max_size (int): Maximum entries of the default in-memory backend.
+        ttl (float | None): Default time to live in seconds (None: never expire).
+        tool_ttl (dict): Time to live per function name, overriding `ttl`.
+            Use 0 to never cache a function.
+        backend: Storage, `MemoryCacheBackend` (default) or `SQLiteCacheBackend`.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1024,
+        ttl: Optional[float] = 300,
+        tool_ttl: Optional[Mapping[str, Optional[float]]] = None,
+        backend: Optional[Any] = None,
+    ):
+        self._ttl = ttl
+        self._tool_ttl = tool_ttl if tool_ttl is not None else {}
+        self._backend = backend if backend is not None else MemoryCacheBackend(max_size)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def is_cacheable(self, function_name: str) -> bool:
+        return self._get_ttl(function_name) != 0
+
+    def get(self, function_name: str, kwargs: Mapping[str, Any]) -> Tuple[bool, Any]:
+        entry = self._backend.get(self._get_key(function_name, kwargs))
+        hit = entry is not None and (entry[0] is None or entry[0] > time.time())
+        with self._lock:
+            if hit:
+                self._hits += 1
+            else:
+                self._misses += 1
+        return (True, entry[1]) if hit else (False, None)
+
+    def set(self, function_name: str, kwargs: Mapping[str, Any], value: Any):
+        ttl = self._get_ttl(function_name)
+        expires_at = None if ttl is None else time.time() + ttl
+        self._backend.set(self._get_key(function_name, kwargs), value, expires_at)
+
+    def clear(self):
+        self._backend.clear()
+
+    def get_stats(self) -> Mapping[str, Any]:
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / total if total > 0 else 0.0,
+            }
+
+    def _get_ttl(self, function_name: str) -> Optional[float]:
+        return self._tool_ttl.get(function_name, self._ttl)
+
+    def _get_key(self, function_name: str, kwargs: Mapping[str, Any]) -> str:
+        return json.dumps(
+            [function_name, kwargs], sort_keys=True, separators=(",", ":"), default=str
+        )
@@ -0,0 +1,246 @@
+import json
+from typing import Any, Callable, List, Mapping, Tuple
+
+from helper import LRUCache, get_metadata, get_metadata_key
+
+# A checker receives a value and its path (for error messages), and returns
+# the (possibly coerced) value or raises `TypeError`
+Checker = Callable[[Any, str], Any]
+_validator_cache = LRUCache(max_size=1024)
+
+
+class ArgumentError(Exception):
+    """Raised by a compiled validator, the details are in `errors`."""
+
+    def __init__(self, errors: Mapping[str, List[str]]):
+        super().__init__(json.dumps(errors))
+        self.errors = errors
+
+
+def get_validator(func: Callable) -> Callable[[Mapping[str, Any]], Mapping[str, Any]]:
+    """Compiled validator of a function, cached by function identity."""
+    key = get_metadata_key(func)
+    validator = _validator_cache.get(key)
+    if validator is None:
+        validator = compile_validator(get_metadata(func))
+        _validator_cache.set(key, validator)
+    return validator
+
+
+def clear_validator_cache():
+    _validator_cache.clear()
+
+
+def compile_validator(metadata: Mapping[str, Any]) -> Callable[[Mapping[str, Any]], Mapping[str, Any]]:  # noqa
+    """
+    Compile the metadata produced by `extract_metadata` into a validator.
+
+    The validator checks missing and unknown arguments, argument types, `Literal`
+    values and nested list/dict shapes. Lossless coercions are applied (e.g.,
+    `"3.5"` to `3.5` for a float argument). It returns the coerced arguments or
+    raises `ArgumentError`.
+    """
+    arguments = metadata["arguments"]
+    required = [name for name, argument in arguments.items() if argument["required"]]
+    checkers = {
+        name: _compile_checker(argument) for name, argument in arguments.items()
+    }
+
+    def validate(kwargs: Mapping[str, Any]) -> Mapping[str, Any]:
+        missing_arguments = [name for name in required if name not in kwargs]
+        invalid_arguments = [name for name in kwargs if name not in checkers]
+        type_errors = []
+        coerced = {}
+        for name, value in kwargs.items():
+            checker = checkers.get(name)
+            if checker is None:
+                continue
+            try:
+                coerced[name] = checker(value, name)
+            except TypeError as exc:
+                type_errors.append(f"{exc}")
+        if missing_arguments or invalid_arguments or type_errors:
+            errors = {}
+            if missing_arguments:
+                errors["missing_arguments"] = missing_arguments
+            if invalid_arguments:
+                errors["invalid_arguments"] = invalid_arguments
+            if type_errors:
+                errors["type_errors"] = type_errors
+            raise ArgumentError(errors)
+        return coerced
+    return validate
+
+
+def _compile_checker(type_info: Mapping[str, Any]) -> Checker:
+    type_name = type_info.get("type")
+    if type_name == "Literal":
+        return _compile_literal_checker(type_info["values"])
+    if type_name in _SCALAR_COERCERS:
+        return _compile_scalar_checker(type_name, _SCALAR_COERCERS[type_name])
+    if type_name in ("list", "List", "set", "Set", "frozenset", "FrozenSet"):
+        elements = type_info.get("elements", [])
+        element_checker = _compile_checker(elements[0]) if elements else _any_checker
+        return _compile_list_checker(type_name, element_checker)
+    if type_name in ("tuple", "Tuple"):
+        elements = type_info.get("elements", [])
+        # `Tuple[int, ...]`: any number of `int`
+        variadic = len(elements) == 2 and elements[1].get("type") == "Ellipsis"
+        return _compile_tuple_checker(
+            [_compile_checker(element) for element in elements[:1 if variadic else None]],  # noqa
+            variadic=variadic,
+        )
+    if type_name in ("dict", "Dict"):
+        if "key_type" not in type_info:
+            return _compile_dict_checker(_any_checker, _any_checker)
+        return _compile_dict_checker(
+            _compile_checker(type_info["key_type"]),
+            _compile_checker(type_info["value_type"]),
+        )
+    # Any, unions, custom classes, etc are passed as is
+    return _any_checker
+
+
+def _any_checker(value: Any, path: str) -> Any:
+    return value
+
+
+def _compile_scalar_checker(type_name: str, coerce: Callable[[Any], Any]) -> Checker:
+    def check(value: Any, path: str) -> Any:
+        try:
+            return coerce(value)
+        except (TypeError, ValueError):
+            raise TypeError(f"`{path}` should be {type_name}, got {json.dumps(value, default=str)}")  # noqa
+    return check
+
+
+def _compile_literal_checker(values: List[Any]) -> Checker:
+    lookup = {}
+    for value in values:
+        lookup.setdefault(_literal_key(value), value)
+
+    def check(value: Any, path: str) -> Any:
+        if value in values and type(value) in [type(valid) for valid in values]:
+            return value
+        key = _literal_key(value)
+        if key in lookup:
+            return lookup[key]
+        raise TypeError(f"`{path}` should be one of {json.dumps(values, default=str)}, got {json.dumps(value, default=str)}")  # noqa
+    return check
+
+
+def _compile_list_checker(type_name: str, element_checker: Checker) -> Checker:
+    def check(value: Any, path: str) -> Any:
+        value = _load_json_string(value, list)
+        if not isinstance(value, (list, tuple, set, frozenset)):
+            raise TypeError(f"`{path}` should be {type_name}, got {json.dumps(value, default=str)}")  # noqa
+        return [
+            element_checker(element, f"{path}[{index}]")
+            for index, element in enumerate(value)
+        ]
+    return check
+
+
+def _compile_tuple_checker(element_checkers: List[Checker], variadic: bool = False) -> Checker:  # noqa
+    def check(value: Any, path: str) -> Any:
+        value = _load_json_string(value, list)
+        if not isinstance(value, (list, tuple)):
+            raise TypeError(f"`{path}` should be tuple, got {json.dumps(value, default=str)}")  # noqa
+        if len(element_checkers) == 0:
+            return tuple(value)
+        if variadic:
+            return tuple([
+                element_checkers[0](element, f"{path}[{index}]")
+                for index, element in enumerate(value)
+            ])
+        if len(value) != len(element_checkers):
+            raise TypeError(f"`{path}` should have {len(element_checkers)} elements, got {len(value)}")  # noqa
+        return tuple([
+            checker(element, f"{path}[{index}]")
+            for index, (checker, element) in enumerate(zip(element_checkers, value))
+        ])
+    return check
+
+
+def _compile_dict_checker(key_checker: Checker, value_checker: Checker) -> Checker:
+    def check(value: Any, path: str) -> Any:
+        value = _load_json_string(value, dict)
+        if not isinstance(value, dict):
+            raise TypeError(f"`{path}` should be dict, got {json.dumps(value, default=str)}")  # noqa
+        return {
+            key_checker(key, f"{path}.{key}"): value_checker(item, f"{path}.{key}")
+            for key, item in value.items()
+        }
+    return check
+
+
+def _coerce_str(value: Any) -> str:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise TypeError()
+
+
+def _coerce_int(value: Any) -> int:
+    if isinstance(value, bool):
+        raise TypeError()
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        try:
+            return int(value.strip())
+        except ValueError:
+            pass
+        # e.g., "3.0", a float is only used when `int` can't parse it
+        number = float(value.strip())
+        if number.is_integer():
+            return int(number)
+    raise TypeError()
+
+
+def _coerce_float(value: Any) -> float:
+    if isinstance(value, bool):
+        raise TypeError()
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        return float(value.strip())
+    raise TypeError()
+
+
+def _coerce_bool(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lower() in ("true", "false"):
+        return value.strip().lower() == "true"
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    raise TypeError()
+
+
+_SCALAR_COERCERS = {
+    "str": _coerce_str,
+    "int": _coerce_int,
+    "float": _coerce_float,
+    "bool": _coerce_bool,
+}
+
+
+def _literal_key(value: Any) -> Tuple[str, str]:
+    if isinstance(value, str):
+        return ("str", value.strip().lower())
+    return ("str", json.dumps(value).lower())
+
+
+def _load_json_string(value: Any, expected_type: type) -> Any:
+    # LLMs sometimes send a JSON encoded list/dict as string
+    if not isinstance(value, str):
+        return value
+    try:
+        loaded = json.loads(value)
+    except ValueError:
+        return value
+    return loaded if isinstance(loaded, expected_type) else value